@@ -10,29 +10,43 @@
 
 import os
 import sys
-import json
-import subprocess
-import platform
+from importlib.metadata import distribution, PackageNotFoundError
 from pathlib import Path
 
-def get_mcp_config_path():
-    """获取 MCP 配置文件路径"""
-    system = platform.system()
-    if system == "Windows":
+_IS_WINDOWS = sys.platform == "win32"
+_IS_MACOS = sys.platform == "darwin"
+
+# 脚本所在目录与当前解释器，只计算一次
+_HERE = Path(__file__).resolve().parent
+_PY = sys.executable
+
+# 模块名 -> PyPI 包名
+_PYPI_NAMES = {
+    "mcp": "mcp",
+    "PIL": "Pillow",
+    "matplotlib": "matplotlib",
+    "numpy": "numpy",
+}
+
+def _resolve_mcp_config_path():
+    """计算 MCP 配置文件路径（仅在模块导入时调用一次）"""
+    if _IS_WINDOWS:
         # Windows: %APPDATA%\Cursor\User\globalStorage\mcp.json
         appdata = os.environ.get("APPDATA")
         if appdata:
-            return Path(appdata) / "Cursor" / "User" / "globalStorage" / "mcp.json"
-    elif system == "Darwin":  # macOS
+            return Path(appdata, "Cursor", "User", "globalStorage", "mcp.json")
+        return None
+    if _IS_MACOS:
         # macOS: ~/Library/Application Support/Cursor/User/globalStorage/mcp.json
-        home = os.path.expanduser("~")
-        return Path(home) / "Library" / "Application Support" / "Cursor" / "User" / "globalStorage" / "mcp.json"
-    else:  # Linux
-        # Linux: ~/.config/Cursor/User/globalStorage/mcp.json
-        home = os.path.expanduser("~")
-        return Path(home) / ".config" / "Cursor" / "User" / "globalStorage" / "mcp.json"
-    
-    return None
+        return Path.home() / "Library/Application Support/Cursor/User/globalStorage/mcp.json"
+    # Linux: ~/.config/Cursor/User/globalStorage/mcp.json
+    return Path.home() / ".config/Cursor/User/globalStorage/mcp.json"
+
+_MCP_CONFIG_PATH = _resolve_mcp_config_path()
+
+def get_mcp_config_path():
+    """获取 MCP 配置文件路径"""
+    return _MCP_CONFIG_PATH
 
 def install_dependencies():
     """安装依赖"""
@@ -40,13 +54,11 @@ def install_dependencies():
     required_modules = ["mcp", "PIL", "matplotlib", "numpy"]
     missing_modules = []
     
+    # 通过已安装包的元数据判断，不执行导入（避免加载 matplotlib/numpy 的开销）
     for module in required_modules:
         try:
-            if module == "PIL":
-                __import__("PIL")
-            else:
-                __import__(module)
-        except ImportError:
+            distribution(_PYPI_NAMES[module])
+        except PackageNotFoundError:
             missing_modules.append(module)
     
     if not missing_modules:
@@ -55,36 +67,41 @@ def install_dependencies():
     
     print(f"发现缺失的依赖: {', '.join(missing_modules)}")
     print("正在安装依赖...")
-    try:
-        requirements_file = Path(__file__).parent / "requirements.txt"
+    import subprocess
+    # 只安装缺失的包，一次 pip 调用完成；无法映射包名时才回退到 requirements.txt
+    packages = [_PYPI_NAMES.get(module) for module in missing_modules]
+    if all(packages):
+        pip_args = packages
+    else:
+        requirements_file = _HERE / "requirements.txt"
         if not requirements_file.exists():
             print("✗ 未找到 requirements.txt 文件")
             return False
-        
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", str(requirements_file)])
-        print("✓ 依赖安装完成")
-        return True
-    except subprocess.CalledProcessError as e:
+        pip_args = ["-r", str(requirements_file)]
+    
+    # 捕获 pip 输出，仅在失败时打印
+    result = subprocess.run(
+        [_PY, "-m", "pip", "install", *pip_args],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode:
         print(f"✗ 依赖安装失败，请手动运行: pip install -r requirements.txt")
-        print(f"错误详情: {e}")
+        print(f"错误详情: {result.stderr or result.stdout}")
         return False
+    
+    print("✓ 依赖安装完成")
+    return True
 
 def generate_config():
     """生成 MCP 配置"""
-    # 获取当前脚本所在目录的绝对路径
-    current_dir = Path(__file__).parent.absolute()
-    server_path = current_dir / "server.py"
-    
-    # 转换为适合操作系统的路径格式
-    if platform.system() == "Windows":
-        server_path_str = str(server_path).replace("\\", "\\\\")
-    else:
-        server_path_str = str(server_path)
+    # 反斜杠由 JSON 序列化时转义，这里无需手动处理
+    server_path_str = str(_HERE / "server.py")
     
     config = {
         "mcpServers": {
             "mind-map-mcp": {
-                "command": sys.executable,
+                "command": _PY,
                 "args": [
                     server_path_str,
                     "stdio"
@@ -94,14 +111,25 @@ def generate_config():
     }
     
     # 如果是 Windows，添加编码环境变量
-    if platform.system() == "Windows":
+    if _IS_WINDOWS:
         config["mcpServers"]["mind-map-mcp"]["env"] = {
             "PYTHONIOENCODING": "utf-8"
         }
     
     return config
 
+def _dump_config(config):
+    """将配置序列化为 UTF-8 JSON 字节（优先使用 orjson）"""
+    try:
+        import orjson
+        return orjson.dumps(config, option=orjson.OPT_INDENT_2)
+    except ImportError:
+        import json
+        return json.dumps(config, indent=2, ensure_ascii=False).encode("utf-8")
+
 def main():
+    import json
+    
     print("=" * 60)
     print("Mind Map MCP Server 安装向导")
     print("=" * 60)
@@ -124,12 +152,24 @@ def main():
         print(json.dumps(config, indent=2, ensure_ascii=False))
         return 1
     
-    # 4. 读取现有配置（如果存在）
+    # 4. 读取现有配置（如果存在），只读取一次，后续步骤复用
     existing_config = {}
-    if config_path.exists():
+    try:
+        existing_bytes = config_path.read_bytes()
+        exists = True
+    except FileNotFoundError:
+        existing_bytes = None
+        exists = False
+    except Exception as e:
+        # 文件存在但无法读取时不能覆盖，否则会丢失其中其他 MCP 服务器的配置
+        print(f"✗ 无法读取现有配置文件: {e}")
+        print("\n请手动将以下配置添加到 MCP 配置文件：")
+        print(json.dumps(config, indent=2, ensure_ascii=False))
+        return 1
+    
+    if exists:
         try:
-            with open(config_path, "r", encoding="utf-8") as f:
-                existing_config = json.load(f)
+            existing_config = json.loads(existing_bytes)
         except Exception as e:
             print(f"警告：无法读取现有配置文件: {e}")
             existing_config = {}
@@ -139,22 +179,34 @@ def main():
         existing_config["mcpServers"] = {}
     
     existing_config["mcpServers"]["mind-map-mcp"] = config["mcpServers"]["mind-map-mcp"]
+    new_bytes = _dump_config(existing_config)
+    
+    # 配置未变化时跳过备份与写入
+    if existing_bytes == new_bytes:
+        print(f"✓ 配置已是最新，无需修改: {config_path}")
+        return 0
     
-    # 6. 备份现有配置
-    if config_path.exists():
+    # 6. 备份现有配置（优先使用硬链接，不复制数据）
+    if exists:
         backup_path = config_path.with_suffix(".json.backup")
         try:
-            import shutil
-            shutil.copy2(config_path, backup_path)
+            backup_path.unlink(missing_ok=True)
+            try:
+                os.link(config_path, backup_path)
+            except OSError:
+                # 文件系统不支持硬链接时回退到复制
+                import shutil
+                shutil.copy2(config_path, backup_path)
             print(f"✓ 已备份现有配置到: {backup_path}")
         except Exception as e:
             print(f"警告：无法备份配置文件: {e}")
     
-    # 7. 写入配置
+    # 7. 写入配置（先写临时文件再原子替换）
     try:
         config_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(config_path, "w", encoding="utf-8") as f:
-            json.dump(existing_config, f, indent=2, ensure_ascii=False)
+        tmp_path = config_path.with_suffix(".json.tmp")
+        tmp_path.write_bytes(new_bytes)
+        os.replace(tmp_path, config_path)
         print(f"✓ 配置已写入: {config_path}")
     except Exception as e:
         print(f"✗ 无法写入配置文件: {e}")
@@ -1,6 +1,3 @@
-import asyncio
-import base64
-import json
 import argparse
 import sys
 import os
@@ -13,167 +10,58 @@ if sys.platform == 'win32':
         sys.stdout.reconfigure(encoding='utf-8')
     if hasattr(sys.stderr, 'reconfigure'):
         sys.stderr.reconfigure(encoding='utf-8')
-from contextlib import asynccontextmanager
-from typing import Any, Dict, List, Optional
 
-from mcp.server import Server
-from mcp.server.stdio import stdio_server
-from mcp.types import (
-    Tool, 
-    TextContent, 
-    ImageContent, 
-    EmbeddedResource, 
-    CallToolResult,
-    CallToolRequest
+from src.server_core import (
+    logger,
+    server,
+    json_loads,
+    TOOL_DISPATCH,
+    INIT_OPTIONS,
+    render_messages,
+    prestart_render_pool,
+    run_stdio,
 )
-# HTTP transport dependencies are imported lazily when needed
 
-# Import existing tool modules from src package
-from src import mind_map_center
-from src import mind_map_free
-from src import mind_map_horizontal
-
-# Initialize the MCP server
-server = Server("mind-map-mcp")
-
-# Helper function to execute the Dify tool logic and convert to MCP response
-def execute_tool(tool_class, markdown_content: str) -> List[Any]:
-    tool_instance = tool_class()
-    
-    # Input parameters expected by the tool
-    params = {
-        "markdown_content": markdown_content,
-        "filename": "mindmap"
-    }
-    
-    # The _invoke method is a generator
-    generator = tool_instance._invoke(params)
-    
-    content = []
-    
-    try:
-        for message in generator:
-            if message["type"] == "blob":
-                # Convert binary blob to base64 encoded image content
-                blob_data = message["blob"]
-                mime_type = message["meta"].get("mime_type", "image/png")
-                encoded_data = base64.b64encode(blob_data).decode("utf-8")
-                
-                content.append(ImageContent(
-                    type="image",
-                    data=encoded_data,
-                    mimeType=mime_type
-                ))
-                
-            elif message["type"] == "text":
-                content.append(TextContent(
-                    type="text",
-                    text=message["text"]
-                ))
-                
-            elif message["type"] == "json":
-                # Append JSON metadata as text for visibility
-                json_str = json.dumps(message["data"], ensure_ascii=False, indent=2)
-                content.append(TextContent(
-                    type="text", 
-                    text=f"Metadata:\n{json_str}"
-                ))
-                
-    except Exception as e:
-        content.append(TextContent(
-            type="text",
-            text=f"Error executing tool: {str(e)}"
-        ))
-        
-    return content
+# --- Transport Implementation ---
+# HTTP transport code is defined inside run_http() to avoid importing dependencies in stdio mode
 
-@server.list_tools()
-async def handle_list_tools() -> List[Tool]:
-    return [
-        Tool(
-            name="create_center_mindmap",
-            description="Create a radial/center layout mind map from Markdown text. Best for core-concept maps.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "markdown_content": {
-                        "type": "string",
-                        "description": "The markdown content to visualize as a mind map. Use headers (#) or list items (-/1.) to define hierarchy."
-                    }
-                },
-                "required": ["markdown_content"]
-            }
-        ),
-        Tool(
-            name="create_horizontal_mindmap",
-            description="Create a horizontal (left-to-right) layout mind map from Markdown text. Best for timelines or process flows.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "markdown_content": {
-                        "type": "string",
-                        "description": "The markdown content to visualize as a mind map."
-                    }
-                },
-                "required": ["markdown_content"]
-            }
-        ),
-        Tool(
-            name="create_free_mindmap",
-            description="Create a smart/free structure mind map. Automatically chooses between Center and Horizontal layouts based on complexity.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "markdown_content": {
-                        "type": "string",
-                        "description": "The markdown content to visualize as a mind map."
-                    }
-                },
-                "required": ["markdown_content"]
-            }
-        )
-    ]
+# /generate sends the PNG in chunks of this size
+_STREAM_CHUNK_SIZE = 64 * 1024
 
-@server.call_tool()
-async def handle_call_tool(name: str, arguments: dict | None) -> List[TextContent | ImageContent | EmbeddedResource]:
-    if not arguments:
-        raise ValueError("Missing arguments")
-    
-    markdown_content = arguments.get("markdown_content")
-    if not markdown_content:
-        raise ValueError("Missing markdown_content")
+# Headers that stop reverse proxies (e.g. nginx) from buffering the long-lived MCP streams
+_UNBUFFERED_HEADERS = ((b"x-accel-buffering", b"no"), (b"cache-control", b"no-cache"))
 
-    if name == "create_center_mindmap":
-        tool_class = mind_map_center.get_tool()
-        return execute_tool(tool_class, markdown_content)
-        
-    elif name == "create_horizontal_mindmap":
-        tool_class = mind_map_horizontal.get_tool()
-        return execute_tool(tool_class, markdown_content)
-        
-    elif name == "create_free_mindmap":
-        tool_class = mind_map_free.get_tool()
-        return execute_tool(tool_class, markdown_content)
-        
-    else:
-        raise ValueError(f"Unknown tool: {name}")
-
-# --- Transport Implementation ---
-# HTTP transport code is defined inside run_http() to avoid importing dependencies in stdio mode
+def _unbuffered_send(send):
+    """Wrap an ASGI send so the response start carries _UNBUFFERED_HEADERS unless already set"""
+    async def _send(message):
+        if message["type"] == "http.response.start":
+            headers = list(message.get("headers", []))
+            present = {name.lower() for name, _ in headers}
+            headers.extend(header for header in _UNBUFFERED_HEADERS if header[0] not in present)
+            message = {**message, "headers": headers}
+        await send(message)
+    return _send
 
 def _create_starlette_app():
     """Create Starlette app with HTTP routes (lazy import)"""
     from mcp.server.sse import SseServerTransport
     from starlette.applications import Starlette
-    from starlette.responses import Response
+    from starlette.responses import Response, StreamingResponse
     from starlette.routing import Route
     
     sse = SseServerTransport("/messages")
+    
+    # Recent Starlette sends memoryview chunks as-is; older releases only accept bytes
+    try:
+        Response(memoryview(b""))
+        stream_views = True
+    except (AttributeError, TypeError):
+        stream_views = False
 
     async def handle_sse(request):
         """Handle SSE (Server-Sent Events) transport"""
-        async with sse.connect_sse(request.scope, request.receive, request._send) as streams:
-            await server.run(streams[0], streams[1], server.create_initialization_options())
+        async with sse.connect_sse(request.scope, request.receive, _unbuffered_send(request._send)) as streams:
+            await server.run(streams[0], streams[1], INIT_OPTIONS)
 
     async def handle_messages(request):
         """Handle POST messages for SSE transport"""
@@ -183,8 +71,8 @@ def _create_starlette_app():
         """Handle Streamable HTTP transport (recommended for remote connections)"""
         # Streamable HTTP uses the same SSE transport but with a different endpoint
         # This allows clients to connect via HTTP POST to /mcp endpoint
-        async with sse.connect_sse(request.scope, request.receive, request._send) as streams:
-            await server.run(streams[0], streams[1], server.create_initialization_options())
+        async with sse.connect_sse(request.scope, request.receive, _unbuffered_send(request._send)) as streams:
+            await server.run(streams[0], streams[1], INIT_OPTIONS)
 
     async def generate_mindmap_http(request):
         """
@@ -193,37 +81,45 @@ def _create_starlette_app():
         Returns: PNG image
         """
         try:
-            body = await request.json()
+            body = json_loads(await request.body())
             content = body.get("markdown_content")
             layout = body.get("layout", "free")
             
             if not content:
                 return Response("Missing 'markdown_content'", status_code=400)
 
-            if layout == "center":
-                tool_cls = mind_map_center.get_tool()
-            elif layout == "horizontal":
-                tool_cls = mind_map_horizontal.get_tool()
-            else:
-                tool_cls = mind_map_free.get_tool()
-                
-            tool_instance = tool_cls()
-            params = {"markdown_content": content, "filename": "http_generated"}
-            
-            generator = tool_instance._invoke(params)
+            # Unknown layouts fall back to the free layout
+            tool_cls = TOOL_DISPATCH.get(layout, TOOL_DISPATCH["free"])
+
+            messages, error = await render_messages(tool_cls, content, "http_generated")
             
             image_data = None
-            for msg in generator:
+            for msg in messages:
                 if msg["type"] == "blob":
                     image_data = msg["blob"]
                     break
             
             if image_data:
-                return Response(image_data, media_type="image/png")
+                # Slices of a memoryview share the PNG buffer instead of copying each chunk
+                view = memoryview(image_data) if stream_views else image_data
+                
+                async def _stream():
+                    # Async generator: a sync iterator would be driven from the threadpool
+                    for start in range(0, len(view), _STREAM_CHUNK_SIZE):
+                        yield view[start:start + _STREAM_CHUNK_SIZE]
+                
+                return StreamingResponse(
+                    _stream(),
+                    media_type="image/png",
+                    headers={"Content-Length": str(len(image_data))}
+                )
+            elif error is not None:
+                return Response(f"Error: {error}", status_code=500)
             else:
                 return Response("Failed to generate image", status_code=500)
                 
         except Exception as e:
+            logger.exception("/generate request failed")
             return Response(f"Error: {str(e)}", status_code=500)
 
     return Starlette(
@@ -235,33 +131,33 @@ def _create_starlette_app():
         ]
     )
 
-def run_stdio():
-    """Run the server using stdio transport"""
-    async def _run():
-        async with stdio_server() as (read, write):
-            await server.run(read, write, server.create_initialization_options())
-    
-    asyncio.run(_run())
-
 def run_http(host: str = "0.0.0.0", port: int = 8899, mode: str = "sse"):
     """Run the server using HTTP transport (SSE or Streamable HTTP)"""
     # Lazy import uvicorn and create Starlette app only when HTTP transport is needed
     import uvicorn
     
     starlette_app = _create_starlette_app()
+    prestart_render_pool()
     
     if mode == "sse":
-        print(f"Starting SSE server on http://{host}:{port}")
-        print(f"SSE Endpoint: http://{host}:{port}/sse")
-        print(f"Messages Endpoint: http://{host}:{port}/messages")
+        logger.info("Starting SSE server on http://%s:%s", host, port)
+        logger.info("SSE Endpoint: http://%s:%s/sse", host, port)
+        logger.info("Messages Endpoint: http://%s:%s/messages", host, port)
     else:  # streamable-http
-        print(f"Starting Streamable HTTP server on http://{host}:{port}")
-        print(f"Streamable HTTP Endpoint: http://{host}:{port}/mcp")
-    uvicorn.run(starlette_app, host=host, port=port)
+        logger.info("Starting Streamable HTTP server on http://%s:%s", host, port)
+        logger.info("Streamable HTTP Endpoint: http://%s:%s/mcp", host, port)
+    
+    # Prefer the uvloop event loop and httptools parser from uvicorn[standard];
+    # fall back to asyncio/h11 when they are missing (uvloop does not support Windows)
+    from importlib.util import find_spec
+    loop = "uvloop" if sys.platform != "win32" and find_spec("uvloop") else "asyncio"
+    http = "httptools" if find_spec("httptools") else "h11"
+    # A single uvicorn worker on purpose: SSE sessions live in this process's memory, so a
+    # /messages POST accepted by another worker would not find its session. Rendering
+    # already runs in the process pool (sized by MIND_MAP_RENDER_WORKERS).
+    uvicorn.run(starlette_app, host=host, port=port, loop=loop, http=http)
 
 if __name__ == "__main__":
-    import os
-    
     parser = argparse.ArgumentParser(description="Mind Map MCP Server")
     parser.add_argument("mode", nargs="?", choices=["stdio", "sse", "streamable-http"], help="Mode to run the server in")
     parser.add_argument("--transport", choices=["stdio", "http"], help="Deprecated: use mode instead")
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # /// script
-# requires-python = ">=3.8"
+# requires-python = ">=3.10"
 # dependencies = [
 #     "mcp",
 #     "pillow",
@@ -15,16 +15,13 @@ Supports running from GitHub URL with uv run
 This version downloads the src modules from GitHub if they're not available locally.
 """
 
-import asyncio
-import base64
-import json
 import argparse
+import logging
 import sys
 import os
-import urllib.request
 import tempfile
-import importlib.util
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Set UTF-8 encoding for Windows
 if sys.platform == 'win32':
@@ -34,28 +31,22 @@ if sys.platform == 'win32':
     if hasattr(sys.stderr, 'reconfigure'):
         sys.stderr.reconfigure(encoding='utf-8')
 
-from contextlib import asynccontextmanager
-from typing import Any, Dict, List, Optional
-
-from mcp.server import Server
-from mcp.server.stdio import stdio_server
-from mcp.types import (
-    Tool, 
-    TextContent, 
-    ImageContent, 
-    EmbeddedResource, 
-    CallToolResult,
-    CallToolRequest
-)
+# Same logger as src/server_core.py; configured here as well because module
+# downloads are reported before the core is importable
+logger = logging.getLogger("mind-map-mcp")
+if not logger.handlers:
+    _log_handler = logging.StreamHandler(sys.stderr)
+    _log_handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_log_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
 
 # Try to import src modules, if not available, download from GitHub
 def ensure_src_modules():
     """Ensure src modules are available, download from GitHub if needed"""
     try:
-        from src import mind_map_center
-        from src import mind_map_free
-        from src import mind_map_horizontal
-        return mind_map_center, mind_map_free, mind_map_horizontal
+        from src import server_core
+        return server_core
     except ImportError:
         # If running from GitHub URL, download src modules with caching
         import hashlib
@@ -70,7 +61,7 @@ def ensure_src_modules():
         os.makedirs(cache_dir, exist_ok=True)
         
         base_url = "https://raw.githubusercontent.com/sawyer-shi/mind-map-mcp/master/src/"
-        modules = ["mind_map_center.py", "mind_map_free.py", "mind_map_horizontal.py"]
+        modules = ["_parse.py", "mind_map_center.py", "mind_map_free.py", "mind_map_horizontal.py", "server_core.py"]
         
         # Create __init__.py if it doesn't exist
         init_file = os.path.join(cache_dir, "__init__.py")
@@ -78,9 +69,11 @@ def ensure_src_modules():
             with open(init_file, "w", encoding="utf-8") as f:
                 f.write("")
         
-        # Download modules (with caching)
-        for module_name in modules:
+        # Download modules (with caching); an ETag stored next to each file turns
+        # the daily refresh into a conditional GET
+        def download_module(client, module_name):
             file_path = os.path.join(cache_dir, module_name)
+            etag_path = os.path.splitext(file_path)[0] + ".etag"
             url = base_url + module_name
             
             # Only download if file doesn't exist or is old (older than 1 day)
@@ -90,174 +83,73 @@ def ensure_src_modules():
                 if file_age < 86400:  # 1 day
                     should_download = False
             
-            if should_download:
-                try:
-                    print(f"Downloading {module_name} from GitHub...", file=sys.stderr)
-                    with urllib.request.urlopen(url, timeout=10) as response:
-                        content = response.read().decode('utf-8')
-                        with open(file_path, "w", encoding="utf-8") as f:
-                            f.write(content)
-                except Exception as e:
-                    if not os.path.exists(file_path):
-                        print(f"Failed to download {module_name}: {e}", file=sys.stderr)
-                        raise
-                    else:
-                        print(f"Download failed, using cached {module_name}", file=sys.stderr)
+            if not should_download:
+                return
+            
+            headers = {}
+            if os.path.exists(file_path) and os.path.exists(etag_path):
+                with open(etag_path, "r", encoding="utf-8") as f:
+                    etag = f.read().strip()
+                if etag:
+                    headers["If-None-Match"] = etag
+            
+            try:
+                logger.info("Downloading %s from GitHub...", module_name)
+                response = client.get(url, headers=headers)
+                if response.status_code == 304:
+                    # Unchanged upstream: keep the cached file and restart its 1-day TTL
+                    os.utime(file_path, None)
+                    return
+                response.raise_for_status()
+                with open(file_path, "w", encoding="utf-8") as f:
+                    f.write(response.content.decode('utf-8'))
+                etag = response.headers.get("ETag")
+                if etag:
+                    with open(etag_path, "w", encoding="utf-8") as f:
+                        f.write(etag)
+                elif os.path.exists(etag_path):
+                    os.remove(etag_path)
+            except Exception as e:
+                if not os.path.exists(file_path):
+                    logger.error("Failed to download %s: %s", module_name, e)
+                    raise
+                else:
+                    logger.warning("Download failed, using cached %s", module_name)
+        
+        # httpx ships with mcp. One client serves all downloads: with the optional h2 package
+        # they share a single HTTP/2 connection, otherwise keep-alive connections are pooled.
+        # The modules are fetched concurrently so a cold start waits for the slowest one only.
+        import httpx
+        from importlib.util import find_spec
+        
+        with httpx.Client(http2=find_spec("h2") is not None, timeout=10.0) as client, \
+                ThreadPoolExecutor(max_workers=len(modules)) as pool:
+            list(pool.map(lambda module_name: download_module(client, module_name), modules))
         
         # Add to sys.path and import
         sys.path.insert(0, cache_base)
-        from src import mind_map_center
-        from src import mind_map_free
-        from src import mind_map_horizontal
+        from src import server_core
         
-        return mind_map_center, mind_map_free, mind_map_horizontal
-
-# Initialize modules
-try:
-    mind_map_center, mind_map_free, mind_map_horizontal = ensure_src_modules()
-except Exception as e:
-    print(f"Error loading modules: {e}", file=sys.stderr)
-    print("Please ensure you have cloned the repository locally.", file=sys.stderr)
-    sys.exit(1)
-
-# Initialize the MCP server
-server = Server("mind-map-mcp")
+        return server_core
 
-# Helper function to execute the tool logic and convert to MCP response
-def execute_tool(tool_class, markdown_content: str) -> List[Any]:
-    tool_instance = tool_class()
-    
-    params = {
-        "markdown_content": markdown_content,
-        "filename": "mindmap"
-    }
-    
-    generator = tool_instance._invoke(params)
-    
-    content = []
-    
+if __name__ == "__main__":
+    # Initialize modules here rather than at import: spawned render workers re-import this
+    # script as __mp_main__ and find src through the sys.path inherited from this process
     try:
-        for message in generator:
-            if message["type"] == "blob":
-                blob_data = message["blob"]
-                mime_type = message["meta"].get("mime_type", "image/png")
-                encoded_data = base64.b64encode(blob_data).decode("utf-8")
-                
-                content.append(ImageContent(
-                    type="image",
-                    data=encoded_data,
-                    mimeType=mime_type
-                ))
-                
-            elif message["type"] == "text":
-                content.append(TextContent(
-                    type="text",
-                    text=message["text"]
-                ))
-                
-            elif message["type"] == "json":
-                json_str = json.dumps(message["data"], ensure_ascii=False, indent=2)
-                content.append(TextContent(
-                    type="text", 
-                    text=f"Metadata:\n{json_str}"
-                ))
-                
+        server_core = ensure_src_modules()
     except Exception as e:
-        content.append(TextContent(
-            type="text",
-            text=f"Error executing tool: {str(e)}"
-        ))
-        
-    return content
-
-@server.list_tools()
-async def handle_list_tools() -> List[Tool]:
-    return [
-        Tool(
-            name="create_center_mindmap",
-            description="Create a radial/center layout mind map from Markdown text. Best for core-concept maps.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "markdown_content": {
-                        "type": "string",
-                        "description": "The markdown content to visualize as a mind map. Use headers (#) or list items (-/1.) to define hierarchy."
-                    }
-                },
-                "required": ["markdown_content"]
-            }
-        ),
-        Tool(
-            name="create_horizontal_mindmap",
-            description="Create a horizontal (left-to-right) layout mind map from Markdown text. Best for timelines or process flows.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "markdown_content": {
-                        "type": "string",
-                        "description": "The markdown content to visualize as a mind map."
-                    }
-                },
-                "required": ["markdown_content"]
-            }
-        ),
-        Tool(
-            name="create_free_mindmap",
-            description="Create a smart/free structure mind map. Automatically chooses between Center and Horizontal layouts based on complexity.",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "markdown_content": {
-                        "type": "string",
-                        "description": "The markdown content to visualize as a mind map."
-                    }
-                },
-                "required": ["markdown_content"]
-            }
-        )
-    ]
-
-@server.call_tool()
-async def handle_call_tool(name: str, arguments: dict | None) -> List[TextContent | ImageContent | EmbeddedResource]:
-    if not arguments:
-        raise ValueError("Missing arguments")
-    
-    markdown_content = arguments.get("markdown_content")
-    if not markdown_content:
-        raise ValueError("Missing markdown_content")
-
-    if name == "create_center_mindmap":
-        tool_class = mind_map_center.get_tool()
-        return execute_tool(tool_class, markdown_content)
-        
-    elif name == "create_horizontal_mindmap":
-        tool_class = mind_map_horizontal.get_tool()
-        return execute_tool(tool_class, markdown_content)
-        
-    elif name == "create_free_mindmap":
-        tool_class = mind_map_free.get_tool()
-        return execute_tool(tool_class, markdown_content)
-        
-    else:
-        raise ValueError(f"Unknown tool: {name}")
-
-def run_stdio():
-    """Run the server using stdio transport"""
-    async def _run():
-        async with stdio_server() as (read, write):
-            await server.run(read, write, server.create_initialization_options())
+        logger.error("Error loading modules: %s", e)
+        logger.error("Please ensure you have cloned the repository locally.")
+        sys.exit(1)
     
-    asyncio.run(_run())
-
-if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Mind Map MCP Server (Standalone)")
     parser.add_argument("mode", nargs="?", default="stdio", choices=["stdio"], help="Mode to run the server in")
     
     args = parser.parse_args()
     
     if args.mode == "stdio":
-        run_stdio()
+        server_core.run_stdio()
     else:
-        print("Only stdio mode is supported in standalone version", file=sys.stderr)
+        logger.error("Only stdio mode is supported in standalone version")
         sys.exit(1)
 
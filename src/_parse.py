@@ -0,0 +1,28 @@
+"""
+Parse cache shared by the three layout modules
+
+Parsed trees are kept per parser, keyed on a digest of the markdown, so trying
+another layout or re-rendering the same input does not parse it again.
+"""
+
+import hashlib
+from typing import Any, Callable, Dict, Tuple
+
+# Total entries across all parsers (FIFO eviction); render passes overwrite every
+# layout field they use, so a cached tree can be laid out again
+_PARSE_CACHE_SIZE = 64
+_PARSE_CACHE: Dict[Tuple[str, str, bytes], Any] = {}
+
+
+def parse_cached(parse: Callable[[str], Any], markdown_text: str) -> Any:
+    """Return parse(markdown_text), reusing the tree of an identical earlier input"""
+    digest = hashlib.blake2b(markdown_text.encode('utf-8'), digest_size=16).digest()
+    # The layouts parse into different tree types, so each parser has its own entries
+    key = (parse.__module__, parse.__qualname__, digest)
+    tree = _PARSE_CACHE.get(key)
+    if tree is None:
+        tree = parse(markdown_text)
+        if len(_PARSE_CACHE) >= _PARSE_CACHE_SIZE:
+            del _PARSE_CACHE[next(iter(_PARSE_CACHE))]
+        _PARSE_CACHE[key] = tree
+    return tree
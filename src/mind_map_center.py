@@ -6,13 +6,96 @@ Generates radial mind maps from Markdown text with PIL-based Chinese font suppor
 Supports unlimited dynamic hierarchical structures
 """
 
+import logging
 import os
 import re
-import tempfile
 import time
 import math
-import shutil
-from typing import Any, Dict, Generator, List, Tuple
+from functools import lru_cache
+from io import BytesIO
+from typing import Any, Dict, Generator, Optional, Tuple
+
+from ._parse import parse_cached
+
+try:
+    import numpy as np
+    from PIL import Image, ImageColor, ImageDraw, ImageFont
+except ImportError:
+    np = None
+    Image = ImageColor = ImageDraw = ImageFont = None
+
+# Markdown line classifier: "#..." headers, "1." numbered items and "-"/"*"/"+" bullets
+_LINE_RE = re.compile(
+    r'^(?:(?P<hashes>#+)(?P<header>.*)'
+    r'|(?P<indent>[^\S\n]*)(?:(?P<number>\d+\.)|[-*+])[^\S\n]+(?P<item>.*))$',
+    re.M
+)
+
+# Inline markdown cleanup for list items
+_BOLD_RE = re.compile(r'\*\*(.*?)\*\*')
+_EMPHASIS_RE = re.compile(r'\*(.*?)\*')
+_BOOK_TITLE_MARKS = str.maketrans('', '', '《》')
+
+# Canvases larger than this many pixels are drawn at a reduced scale, but labels are
+# not shrunk below _MIN_FONT_PX (the smallest unscaled label font is 24px); the canvas
+# grows instead, up to _HARD_MAX_OUTPUT_PIXELS
+_MAX_OUTPUT_PIXELS = 16_000_000
+_HARD_MAX_OUTPUT_PIXELS = 64_000_000
+_MIN_FONT_PX = 12
+_MIN_TEXT_SCALE = _MIN_FONT_PX / 24
+
+logger = logging.getLogger("mind-map-mcp")
+
+def _output_scale(img_w: int, img_h: int) -> float:
+    """Draw scale for an img_w x img_h layout under the output pixel limits"""
+    pixels = img_w * img_h
+    if pixels <= _MAX_OUTPUT_PIXELS:
+        return 1.0
+    scale = max(math.sqrt(_MAX_OUTPUT_PIXELS / pixels), _MIN_TEXT_SCALE)
+    if pixels * scale * scale > _HARD_MAX_OUTPUT_PIXELS:
+        scale = math.sqrt(_HARD_MAX_OUTPUT_PIXELS / pixels)
+        logger.warning("Mind map of %dx%d px drawn at %.0f%% scale; smallest labels are about %dpx",
+                       img_w, img_h, scale * 100, round(24 * scale))
+    else:
+        logger.info("Mind map of %dx%d px drawn at %.0f%% scale", img_w, img_h, scale * 100)
+    return scale
+
+# Shared 1x1 draw surface used only for text measurement
+_MEASURE_DRAW = None
+
+
+@lru_cache(maxsize=32)
+def _get_font(font_file: str, font_size: int):
+    """
+    Load a font once per (font_file, font_size); returns None if no font is available
+    """
+    if font_file:
+        try:
+            return ImageFont.truetype(font_file, font_size)
+        except Exception:
+            pass
+    
+    try:
+        return ImageFont.load_default()
+    except Exception:
+        return None
+
+
+@lru_cache(maxsize=4096)
+def _measure_cached(text: str, font_size: int, font_file: str) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Text bounding box for (text, font_size, font_file), or None if no font is available
+    """
+    global _MEASURE_DRAW
+    
+    font = _get_font(font_file, font_size)
+    if font is None:
+        return None
+    
+    if _MEASURE_DRAW is None:
+        _MEASURE_DRAW = ImageDraw.Draw(Image.new('RGB', (1, 1)))
+    return _MEASURE_DRAW.textbbox((0, 0), text, font=font)
+
 
 class MindMapCenterTool:
     
@@ -25,13 +108,11 @@ class MindMapCenterTool:
     def create_json_message(self, data: Dict[str, Any]) -> Dict[str, Any]:
         return {"type": "json", "data": data}
 
-    def _setup_pil_chinese_font(self, temp_dir):
+    def _setup_pil_chinese_font(self):
         """
         使用PIL/Pillow进行中文字体处理的解决方案 - 优先使用嵌入字体
         """
-        try:
-            from PIL import Image, ImageDraw, ImageFont
-        except ImportError:
+        if ImageFont is None:
             return None
             
         import platform
@@ -88,52 +169,33 @@ class MindMapCenterTool:
         Universal Markdown parser - supports unlimited dynamic hierarchical structures
         """
         markdown_text = markdown_text.replace('\\n', '\n')
-        lines = markdown_text.strip().split('\n')
         nodes = []
         node_stack = []
         last_header_level = 0
         
-        for line in lines:
-            line = line.rstrip()
-            if not line or line.startswith('```'):
-                continue
-                
-            level = 0
-            content = ""
-            is_header = False
+        # One scan over the whole text; lines that are neither headers nor list items never match
+        for match in _LINE_RE.finditer(markdown_text.strip()):
+            hashes = match.group('hashes')
             
             # Handle headers
-            if line.startswith('#'):
-                header_count = 0
-                for char in line:
-                    if char == '#':
-                        header_count += 1
-                    else:
-                        break
-                level = header_count
-                content = line[header_count:].strip()
-                is_header = True
+            if hashes:
+                level = len(hashes)
+                content = match.group('header').strip()
                 last_header_level = level
                 
             # Handle numbered lists
-            elif re.match(r'^\s*\d+\.\s+', line):
-                leading_spaces = len(line) - len(line.lstrip())
-                level = leading_spaces // 2 + 2
-                content = re.sub(r'^\s*\d+\.\s*', '', line)
-                content = self._clean_markdown_text(content)
+            elif match.group('number'):
+                level = len(match.group('indent')) // 2 + 2
+                content = self._clean_markdown_text(match.group('item').rstrip())
                 
             # Handle bullet lists
-            elif re.match(r'^\s*[-\*\+]\s+', line):
-                leading_spaces = len(line) - len(line.lstrip())
+            else:
+                leading_spaces = len(match.group('indent'))
                 if leading_spaces == 0 and last_header_level > 0:
                     level = last_header_level + 1
                 else:
                     level = leading_spaces // 2 + 2
-                content = re.sub(r'^\s*[-\*\+]\s*', '', line)
-                content = self._clean_markdown_text(content)
-                
-            else:
-                continue
+                content = self._clean_markdown_text(match.group('item').rstrip())
                 
             if not content:
                 continue
@@ -144,11 +206,11 @@ class MindMapCenterTool:
                 'children': []
             }
             
-            if not is_header and not re.match(r'^\s*[-\*\+]\s+', line):
+            if match.group('number'):
                 last_header_level = 0
             
             while node_stack and node_stack[-1]['level'] >= level:
-                node_stack.pop()
+                self._finalize_weight(node_stack.pop())
             
             if node_stack:
                 node_stack[-1]['children'].append(node)
@@ -157,56 +219,59 @@ class MindMapCenterTool:
             
             node_stack.append(node)
         
+        # Remaining open nodes are finalized deepest first, so children precede parents
+        while node_stack:
+            self._finalize_weight(node_stack.pop())
+        
         if not nodes:
-            return {'content': 'Mind Map', 'level': 1, 'children': []}
+            return {'content': 'Mind Map', 'level': 1, 'children': [], 'weight': 1}
             
         if len(nodes) == 1:
             return nodes[0]
         
-        return {
+        return self._finalize_weight({
             'content': 'Mind Map',
             'level': 1, 
             'children': nodes
-        }
+        })
+
+    def _finalize_weight(self, node: dict) -> dict:
+        """
+        Stamp a closed node's weight (number of leaves in its subtree) from its children.
+        This ensures complex branches get more angular space.
+        """
+        children = node['children']
+        node['weight'] = sum(child['weight'] for child in children) if children else 1
+        return node
 
     def _clean_markdown_text(self, text: str) -> str:
-        text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)
-        text = re.sub(r'\*(.*?)\*', r'\1', text)
-        text = text.replace('《', '').replace('》', '')
-        text = re.sub(r'\*\*(.*?)\*\*:\s*', r'\1: ', text)
+        text = _BOLD_RE.sub(r'\1', text)
+        text = _EMPHASIS_RE.sub(r'\1', text)
+        text = text.translate(_BOOK_TITLE_MARKS)
         return text.strip()
 
-    def _calculate_tree_depth(self, node: dict) -> int:
-        if not node.get('children'):
-            return 1
-        return 1 + max(self._calculate_tree_depth(child) for child in node['children'])
-
-    def _get_all_nodes(self, node: dict) -> List[dict]:
-        nodes = [node]
-        for child in node.get('children', []):
-            nodes.extend(self._get_all_nodes(child))
-        return nodes
-
-    def _calculate_subtree_weight(self, node: dict) -> int:
+    def _calculate_tree_metrics(self, root: dict) -> Tuple[int, int]:
         """
-        Calculate weight of subtree based on number of leaves.
-        This ensures complex branches get more angular space.
+        Single iterative walk returning (tree depth, node count)
         """
-        if not node.get('children'):
-            node['weight'] = 1
-            return 1
+        stack = [(root, 1)]
+        depth = 0
+        count = 0
+        while stack:
+            node, level = stack.pop()
+            depth = max(depth, level)
+            count += 1
+            for child in node.get('children', ()):
+                stack.append((child, level + 1))
         
-        weight = sum(self._calculate_subtree_weight(child) for child in node['children'])
-        node['weight'] = weight
-        return weight
+        return depth, count
 
-    def _measure_text_size(self, text: str, depth_level: int, font_file: str = None) -> Tuple[int, int]:
+    def _measure_text_size(self, text: str, depth_level: int, font_file: str = None):
         """
-        Estimate text dimensions using PIL font
+        Measure text using PIL font
+        Returns ((width, height) including padding, text bbox or None if no font is available)
         """
         try:
-            from PIL import ImageFont, ImageDraw, Image
-            
             safe_text = str(text).strip()
             if not safe_text:
                 safe_text = f"Node{depth_level}"
@@ -215,42 +280,39 @@ class MindMapCenterTool:
             base_font_size = 42
             font_size = max(base_font_size - (depth_level * 6), 24)
             
-            font = None
-            if font_file and os.path.exists(font_file):
-                try:
-                    font = ImageFont.truetype(font_file, font_size)
-                except Exception:
-                    pass
-            
-            if font is None:
-                try:
-                    font = ImageFont.load_default()
-                except:
-                    # Fallback estimation
-                    return len(safe_text) * font_size * 0.6 + 20, font_size + 20
-            
-            # Create a dummy image to get a draw object
-            dummy_img = Image.new('RGB', (1, 1))
-            draw = ImageDraw.Draw(dummy_img)
+            bbox = _measure_cached(safe_text, font_size, font_file)
+            if bbox is None:
+                # Fallback estimation
+                return (len(safe_text) * font_size * 0.6 + 20, font_size + 20), None
             
-            bbox = draw.textbbox((0, 0), safe_text, font=font)
             text_width = bbox[2] - bbox[0]
             text_height = bbox[3] - bbox[1]
             
             # Add padding
             padding = max(18 - depth_level * 2, 10)
-            return text_width + 2 * padding, text_height + 2 * padding
+            return (text_width + 2 * padding, text_height + 2 * padding), bbox
             
         except Exception:
-            return len(str(text)) * 15 + 20, 40 # Rough fallback
+            return (len(str(text)) * 15 + 20, 40), None # Rough fallback
 
-    def _draw_text_with_pil(self, img, draw, x, y, text, depth_level, color, font_file):
+    def _precompute_text_sizes(self, root: dict, font_file: str):
         """
-        使用PIL绘制中文文本
+        Measure every node once so layout and drawing share the same result
         """
-        try:
-            from PIL import ImageFont, ImageDraw
+        stack = [(root, 1)]
+        while stack:
+            node, depth_level = stack.pop()
+            node['_size'], node['_bbox'] = self._measure_text_size(node.get('content', 'Node'), depth_level, font_file)
             
+            for child in node.get('children', []):
+                stack.append((child, depth_level + 1))
+
+    def _prepare_text_box(self, img_size, draw, x, y, text, depth_level, color, font_file, bbox=None, scale=1.0):
+        """
+        计算节点背景框和文本的绘制参数（绘制在 _generate_png_mindmap 中批量进行）
+        Returns (box, border_width, color, (x, y), text, font, bbox), or None if nothing should be drawn
+        """
+        try:
             safe_text = str(text).strip()
             if not safe_text:
                 safe_text = f"Node{depth_level}"
@@ -258,33 +320,32 @@ class MindMapCenterTool:
             # 字体大小
             base_font_size = 42
             font_size = max(base_font_size - (depth_level * 6), 24)
+            padding = max(18 - depth_level * 2, 10)
+            if depth_level == 1:
+                border_width = 4
+            else:
+                border_width = 3
             
-            # 加载字体
-            font = None
-            if font_file and os.path.exists(font_file):
-                try:
-                    font = ImageFont.truetype(font_file, font_size)
-                except Exception:
-                    pass
+            # Reduced-scale canvases shrink labels with the layout; the pre-measured bbox
+            # belongs to the full-size font, so it is measured again
+            if scale < 1.0:
+                font_size = max(1, round(font_size * scale))
+                padding = max(1, round(padding * scale))
+                border_width = max(1, round(border_width * scale))
+                bbox = _measure_cached(safe_text, font_size, font_file)
             
+            # 加载字体（按路径和字号缓存）
+            font = _get_font(font_file, font_size)
             if font is None:
-                try:
-                    font = ImageFont.load_default()
-                except:
-                    return
+                return None
             
-            # 计算文本大小
-            bbox = draw.textbbox((0, 0), safe_text, font=font)
+            # 计算文本大小（优先使用预先测量的结果）
+            if bbox is None:
+                bbox = draw.textbbox((0, 0), safe_text, font=font)
             text_width = bbox[2] - bbox[0]
             text_height = bbox[3] - bbox[1]
             
             # 背景框
-            padding = max(18 - depth_level * 2, 10)
-            if depth_level == 1:
-                border_width = 4
-            else:
-                border_width = 3
-            
             box_width = text_width + 2 * padding
             box_height = text_height + 2 * padding
             
@@ -293,359 +354,358 @@ class MindMapCenterTool:
             box_x2 = x + box_width // 2
             box_y2 = y + box_height // 2
             
-            # 绘制圆角矩形
-            draw.rounded_rectangle([box_x1, box_y1, box_x2, box_y2], 
-                                 radius=5, fill='white', outline=color, width=border_width)
+            # 完全位于画布之外时跳过绘制
+            img_w, img_h = img_size
+            if box_x2 < 0 or box_y2 < 0 or box_x1 > img_w or box_y1 > img_h:
+                return None
             
-            # 文本居中
-            try:
-                draw.text((x, y), safe_text, font=font, fill=color, anchor='mm')
-            except TypeError:
-                text_x = x - text_width / 2
-                text_baseline_offset = bbox[1]
-                text_visual_height = bbox[3] - bbox[1]
-                text_y = y - (text_baseline_offset + text_visual_height / 2)
-                draw.text((text_x, text_y), safe_text, font=font, fill=color)
+            return [box_x1, box_y1, box_x2, box_y2], border_width, color, (x, y), safe_text, font, bbox
             
         except Exception:
-            pass
+            return None
 
-    def _generate_png_mindmap(self, tree_data: dict, output_file: str, temp_dir: str) -> bool:
+    def _layout_nodes(self, tree_data: dict) -> list:
         """
-        Generate PNG mind map with free structure layout (Collision-free Radial)
+        Place every node of a measured tree (see _precompute_text_sizes) around the root.
+        Returns the node dicts used for drawing: centre 'x', 'y', 'width', 'height', ...
         """
-        try:
-            # 设置PIL中文字体
-            font_file = self._setup_pil_chinese_font(temp_dir)
-            
-            import matplotlib
-            matplotlib.use('Agg')
-            import matplotlib.pyplot as plt
-            import numpy as np
-            from PIL import Image, ImageDraw
-            
-            # 预计算权重
-            self._calculate_subtree_weight(tree_data)
-            
-            # 颜色
-            branch_colors = [
-                '#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FECA57', '#FF9FF3', 
-                '#54A0FF', '#5F27CD', '#00D2D3', '#FF9F43', '#EE5A24', '#0984E3'
-            ]
-            
-            # Store layout results: {'x', 'y', 'w', 'h', 'text', 'depth', 'color', 'children': []}
-            layout_nodes = []
-            # To check for collisions: list of (x, y, w, h)
-            placed_boxes = []
-            # Track minimum radius for each depth level to enforce strict hierarchy
-            min_radius_by_depth = {}  # {depth_level: min_radius}
-            # Track parent radius to ensure children are always further out
-            parent_radius_map = {}  # {node_id: parent_radius}
-
-            def check_collision(x, y, w, h, margin=20):
-                """Check if the box collides with any existing boxes"""
-                # Simple AABB collision
-                l1, r1 = x - w/2 - margin, x + w/2 + margin
-                t1, b1 = y - h/2 - margin, y + h/2 + margin
-                
-                for bx, by, bw, bh in placed_boxes:
-                    l2, r2 = bx - bw/2, bx + bw/2
-                    t2, b2 = by - bh/2, by + bh/2
-                    
-                    if not (l1 > r2 or r1 < l2 or t1 > b2 or b1 < t2):
-                        return True
-                return False
-
-            def get_min_radius_for_depth(depth_level, parent_radius=0, parent_size=None, current_size=None):
-                """
-                Calculate minimum radius for a depth level to ensure strict hierarchy.
-                Uses node sizes to calculate compact but safe distances.
-                """
-                # Reduced base minimum radius for more compact layout
-                # Original: 150 + (depth_level - 1) * 200
-                # Optimized: 100 + (depth_level - 1) * 120
-                base_min_radius = 100 + (depth_level - 1) * 120
-                
-                # Ensure child radius is always greater than parent radius
-                if parent_radius > 0:
-                    # Calculate safe distance based on actual node sizes
-                    if parent_size and current_size:
-                        # parent_size and current_size are (width, height) tuples
-                        parent_diagonal = math.sqrt(parent_size[0]**2 + parent_size[1]**2) / 2
-                        current_diagonal = math.sqrt(current_size[0]**2 + current_size[1]**2) / 2
-                        # Safe distance: half of parent diagonal + half of current diagonal + small gap
-                        safe_distance = parent_diagonal + current_diagonal + 30  # Reduced from fixed 120
-                    else:
-                        # Fallback: use smaller fixed distance
-                        safe_distance = 60  # Reduced from 120
-                    
-                    required_radius = parent_radius + safe_distance
-                    base_min_radius = max(base_min_radius, required_radius)
+        # 颜色
+        branch_colors = [
+            '#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FECA57', '#FF9FF3', 
+            '#54A0FF', '#5F27CD', '#00D2D3', '#FF9F43', '#EE5A24', '#0984E3'
+        ]
+        
+        # Store layout results: {'x', 'y', 'w', 'h', 'text', 'depth', 'color', 'children': []}
+        layout_nodes = []
+        # To check for collisions: list of (x, y, w, h)
+        placed_boxes = []
+        # Uniform spatial hash over placed_boxes: {(cell_x, cell_y): [box_index, ...]}
+        grid_cell = 200
+        box_grid = {}
+        # Track minimum radius for each depth level to enforce strict hierarchy
+        min_radius_by_depth = {}  # {depth_level: min_radius}
+
+        def grid_cells(left, top, right, bottom):
+            """Grid cells overlapped by the rectangle"""
+            for cx in range(math.floor(left / grid_cell), math.floor(right / grid_cell) + 1):
+                for cy in range(math.floor(top / grid_cell), math.floor(bottom / grid_cell) + 1):
+                    yield cx, cy
+
+        def place_box(x, y, w, h):
+            """Register a placed box and index it in every grid cell it overlaps"""
+            index = len(placed_boxes)
+            placed_boxes.append((x, y, w, h))
+            for cell in grid_cells(x - w/2, y - h/2, x + w/2, y + h/2):
+                box_grid.setdefault(cell, []).append(index)
+
+        def clear_radius_along_ray(cos_a, sin_a, w, h, min_radius, margin=20):
+            """
+            Smallest radius >= min_radius at which a (w, h) box centred on the ray
+            (r*cos_a, r*sin_a) does not overlap any placed box (AABB with margin).
+            """
+            checked = set()
+            blocked = []
+            r = min_radius
+            while True:
+                # Only test boxes in the cells swept by the next grid_cell-long stretch of the ray
+                end = r + grid_cell
+                x0, x1 = sorted((r * cos_a, end * cos_a))
+                y0, y1 = sorted((r * sin_a, end * sin_a))
+                reach_x, reach_y = w / 2 + margin, h / 2 + margin
+                for cell in grid_cells(x0 - reach_x, y0 - reach_y, x1 + reach_x, y1 + reach_y):
+                    for index in box_grid.get(cell, ()):
+                        if index in checked:
+                            continue
+                        checked.add(index)
+                        
+                        bx, by, bw, bh = placed_boxes[index]
+                        # Radii where the boxes overlap on one axis: |r*d - c| <= reach
+                        lo, hi = -math.inf, math.inf
+                        for d, c, reach in ((cos_a, bx, (w + bw) / 2 + margin), (sin_a, by, (h + bh) / 2 + margin)):
+                            if abs(d) < 1e-12:
+                                if abs(c) > reach:
+                                    break
+                                continue
+                            r1, r2 = (c - reach) / d, (c + reach) / d
+                            lo, hi = max(lo, min(r1, r2)), min(hi, max(r1, r2))
+                        else:
+                            if lo <= hi and hi >= min_radius:
+                                blocked.append((lo, hi))
                 
-                # Update global minimum for this depth level
-                if depth_level not in min_radius_by_depth:
-                    min_radius_by_depth[depth_level] = base_min_radius
+                # Sweep blocked intervals outward, stepping just past each one that covers r
+                blocked.sort()
+                for lo, hi in blocked:
+                    if lo > r:
+                        break
+                    if hi >= r:
+                        r = hi + 0.5
+                # Any box overlapping a radius within the swept stretch has been tested,
+                # so r is final; otherwise continue the walk from r
+                if r <= end:
+                    return r
+
+        def get_min_radius_for_depth(depth_level, parent_radius=0, parent_size=None, current_size=None):
+            """
+            Calculate minimum radius for a depth level to ensure strict hierarchy.
+            Uses node sizes to calculate compact but safe distances.
+            """
+            # Reduced base minimum radius for more compact layout
+            # Original: 150 + (depth_level - 1) * 200
+            # Optimized: 100 + (depth_level - 1) * 120
+            base_min_radius = 100 + (depth_level - 1) * 120
+            
+            # Ensure child radius is always greater than parent radius
+            if parent_radius > 0:
+                # Calculate safe distance based on actual node sizes
+                if parent_size and current_size:
+                    # parent_size and current_size are (width, height) tuples
+                    parent_diagonal = math.hypot(parent_size[0], parent_size[1]) / 2
+                    current_diagonal = math.hypot(current_size[0], current_size[1]) / 2
+                    # Safe distance: half of parent diagonal + half of current diagonal + small gap
+                    safe_distance = parent_diagonal + current_diagonal + 30  # Reduced from fixed 120
                 else:
-                    min_radius_by_depth[depth_level] = max(min_radius_by_depth[depth_level], base_min_radius)
+                    # Fallback: use smaller fixed distance
+                    safe_distance = 60  # Reduced from 120
                 
-                return min_radius_by_depth[depth_level]
-
-            def layout_recursive(node, parent_x, parent_y, start_angle, end_angle, depth_level, inherited_color, parent_radius=0, parent_size=None, node_id=None):
-                """
-                Recursive layout with strict hierarchy enforcement and enhanced collision detection.
-                Ensures all elements extend outward only, never inward.
-                Optimized for compact layout while maintaining no-overlap guarantee.
-                """
-                content = node.get('content', 'Node')
-                children = node.get('children', [])
+                required_radius = parent_radius + safe_distance
+                base_min_radius = max(base_min_radius, required_radius)
+            
+            # Update global minimum for this depth level
+            if depth_level not in min_radius_by_depth:
+                min_radius_by_depth[depth_level] = base_min_radius
+            else:
+                min_radius_by_depth[depth_level] = max(min_radius_by_depth[depth_level], base_min_radius)
+            
+            return min_radius_by_depth[depth_level]
+
+        # Layout with strict hierarchy enforcement and enhanced collision detection.
+        # Ensures all elements extend outward only, never inward.
+        # Nodes are placed in pre-order from an explicit work stack:
+        # (node, parent_x, parent_y, start_angle, end_angle, depth_level, inherited_color, parent_radius, parent_size)
+        stack = [(tree_data, 0, 0, 0, 2*math.pi, 1, '#333333', 0, None)]
+        while stack:
+            (node, parent_x, parent_y, start_angle, end_angle,
+             depth_level, inherited_color, parent_radius, parent_size) = stack.pop()
+            content = node.get('content', 'Node')
+            children = node.get('children', [])
+            
+            # Text size measured up front by _precompute_text_sizes
+            w, h = node['_size']
+            current_size = (w, h)
+            
+            if depth_level == 1:
+                # Root node
+                x, y = 0, 0
+                node_color = '#333333'
+                current_radius = 0
+            else:
+                node_color = inherited_color
                 
-                # Generate unique node ID for tracking
-                if node_id is None:
-                    node_id = f"node_{depth_level}_{id(node)}"
+                # Calculate minimum radius for this depth level (strict hierarchy)
+                # Pass node sizes for more accurate distance calculation
+                min_radius = get_min_radius_for_depth(depth_level, parent_radius, parent_size, current_size)
                 
-                # Measure text size
-                w, h = self._measure_text_size(content, depth_level, font_file)
-                current_size = (w, h)
+                # Preliminary polar coordinates calculation
+                mid_angle = (start_angle + end_angle) / 2
                 
-                if depth_level == 1:
-                    # Root node
-                    x, y = 0, 0
-                    node_color = '#333333'
-                    current_radius = 0
-                else:
-                    node_color = inherited_color
-                    
-                    # Calculate minimum radius for this depth level (strict hierarchy)
-                    # Pass node sizes for more accurate distance calculation
-                    min_radius = get_min_radius_for_depth(depth_level, parent_radius, parent_size, current_size)
-                    
-                    # Preliminary polar coordinates calculation
-                    mid_angle = (start_angle + end_angle) / 2
-                    
-                    # Start from minimum radius (never go inward)
-                    radius_base = min_radius
-                    
-                    # Optimized collision resolution with smaller, more precise steps
-                    # Use smaller base step for finer positioning
-                    base_step = 20 + (depth_level - 1) * 5  # Reduced from 60 + (depth-1)*10
-                    max_attempts = 150  # More attempts with smaller steps
-                    
-                    final_x, final_y = 0, 0
-                    placed = False
-                    current_radius = 0
-                    
-                    # Try placing along the radial line, pushing outwards if collision
-                    # CRITICAL: Never allow inward movement - always start from min_radius
-                    for attempt in range(max_attempts):
-                        # Use smaller, more precise steps for compact layout
-                        # Only slightly increase step size for later attempts
-                        step = base_step * (1 + attempt * 0.05)  # Reduced from 0.1 to 0.05
-                        test_r = radius_base + attempt * step
-                        
-                        # Ensure we never go inward (strict hierarchy enforcement)
-                        if test_r < min_radius:
-                            test_r = min_radius
-                        
-                        test_x = test_r * math.cos(mid_angle)
-                        test_y = test_r * math.sin(mid_angle)
-                        
-                        if not check_collision(test_x, test_y, w, h):
-                            final_x, final_y = test_x, test_y
-                            current_radius = test_r
-                            placed = True
-                            break
-                    
-                    if not placed:
-                        # Fallback: place at maximum attempted radius
-                        final_x = test_r * math.cos(mid_angle)
-                        final_y = test_r * math.sin(mid_angle)
-                        current_radius = test_r
-                    
-                    x, y = final_x, final_y
-                    
-                    # Update minimum radius for this depth level based on actual placement
-                    # But don't update too aggressively to avoid pushing everything out
-                    if current_radius > min_radius_by_depth.get(depth_level, 0):
-                        # Only update if significantly larger (avoid minor updates that push everything out)
-                        if current_radius > min_radius_by_depth.get(depth_level, 0) * 1.2:
-                            min_radius_by_depth[depth_level] = current_radius
+                # Solve for the first collision-free radius along the ray in one shot
+                # CRITICAL: Never allow inward movement - always start from min_radius
+                cos_a, sin_a = math.cos(mid_angle), math.sin(mid_angle)
+                current_radius = clear_radius_along_ray(cos_a, sin_a, w, h, min_radius)
+                x, y = current_radius * cos_a, current_radius * sin_a
                 
-                # Store parent radius for children
-                parent_radius_map[node_id] = current_radius
+                # Update minimum radius for this depth level based on actual placement
+                # But don't update too aggressively to avoid pushing everything out
+                if current_radius > min_radius_by_depth.get(depth_level, 0):
+                    # Only update if significantly larger (avoid minor updates that push everything out)
+                    if current_radius > min_radius_by_depth.get(depth_level, 0) * 1.2:
+                        min_radius_by_depth[depth_level] = current_radius
 
-                # Register placed box
-                placed_boxes.append((x, y, w, h))
+            # Register placed box
+            place_box(x, y, w, h)
+            
+            # Store node info for drawing
+            node_info = {
+                'x': x, 'y': y, 
+                'parent_x': parent_x, 'parent_y': parent_y,
+                'text': content, 'depth': depth_level, 
+                'color': node_color, 'width': w, 'height': h,
+                'bbox': node.get('_bbox')
+            }
+            layout_nodes.append(node_info)
+            
+            # Process children
+            if children:
+                total_weight = sum(child.get('weight', 1) for child in children)
+                angle_range = end_angle - start_angle
                 
-                # Store node info for drawing
-                node_info = {
-                    'x': x, 'y': y, 
-                    'parent_x': parent_x, 'parent_y': parent_y,
-                    'text': content, 'depth': depth_level, 
-                    'color': node_color, 'width': w, 'height': h
-                }
-                layout_nodes.append(node_info)
+                current_angle = start_angle
+                child_items = []
                 
-                # Process children
-                if children:
-                    total_weight = sum(child.get('weight', 1) for child in children)
-                    angle_range = end_angle - start_angle
+                for i, child in enumerate(children):
+                    child_weight = child.get('weight', 1)
+                    child_angle_step = (child_weight / total_weight) * angle_range
                     
-                    current_angle = start_angle
+                    child_start = current_angle
+                    child_end = current_angle + child_angle_step
                     
-                    for i, child in enumerate(children):
-                        child_weight = child.get('weight', 1)
-                        child_angle_step = (child_weight / total_weight) * angle_range
-                        
-                        child_start = current_angle
-                        child_end = current_angle + child_angle_step
-                        
-                        # Determine color
-                        if depth_level == 1:
-                            child_c = branch_colors[i % len(branch_colors)]
-                        else:
-                            child_c = inherited_color
-                        
-                        # Pass parent radius and size to ensure child is always further out
-                        child_node_id = f"{node_id}_child_{i}"
-                        layout_recursive(child, x, y, child_start, child_end, depth_level + 1, child_c, 
-                                       parent_radius=current_radius, parent_size=current_size, node_id=child_node_id)
-                        
-                        current_angle += child_angle_step
-
-            # Start Layout
-            layout_recursive(tree_data, 0, 0, 0, 2*math.pi, 1, '#333333', parent_radius=0, parent_size=None, node_id='root')
-            
-            # Calculate dynamic canvas size with enhanced margin
-            if not layout_nodes:
-                return False
-            
-            # Calculate bounding box with node dimensions
-            min_x = min(n['x'] - n['width']/2 for n in layout_nodes)
-            max_x = max(n['x'] + n['width']/2 for n in layout_nodes)
-            min_y = min(n['y'] - n['height']/2 for n in layout_nodes)
-            max_y = max(n['y'] + n['height']/2 for n in layout_nodes)
-            
-            # Calculate maximum radius to ensure adequate space
-            max_radius = 0
-            for n in layout_nodes:
-                node_radius = math.sqrt(n['x']**2 + n['y']**2)
-                # Add half of node diagonal to account for node size
-                node_diagonal = math.sqrt(n['width']**2 + n['height']**2) / 2
-                total_radius = node_radius + node_diagonal
-                max_radius = max(max_radius, total_radius)
-            
-            # Enhanced margin calculation based on maximum radius and depth
-            # Deeper structures need more margin
-            max_depth = max(n['depth'] for n in layout_nodes) if layout_nodes else 1
-            base_margin = 150
-            depth_margin = max_depth * 30  # Additional margin per depth level
-            margin = base_margin + depth_margin
-            
-            # Calculate canvas size with enhanced margin
-            total_width = max_x - min_x + 2 * margin
-            total_height = max_y - min_y + 2 * margin
-            
-            # Ensure minimum size based on maximum radius
-            min_size_from_radius = (max_radius + margin) * 2
-            total_width = max(total_width, min_size_from_radius, 1000)
-            total_height = max(total_height, min_size_from_radius, 800)
-            
-            # Matplotlib figsize is in inches. Assume dpi=100
-            dpi = 100
-            fig_width = total_width / dpi
-            fig_height = total_height / dpi
-            
-            # Re-create figure with calculated size
-            plt.close() # Close initial dummy figure
-            fig, ax = plt.subplots(1, 1, figsize=(fig_width, fig_height), dpi=dpi)
-            
-            # Set limits to match our coordinate system
-            ax.set_xlim(min_x - margin, max_x + margin)
-            ax.set_ylim(min_y - margin, max_y + margin)
-            ax.axis('off')
-            
-            # Helper for drawing lines
-            def draw_curved_branch_line(start_x, start_y, end_x, end_y, color='#333333', linewidth=3):
-                """Draw smooth curved branch line"""
-                if abs(start_x - end_x) < 0.01 and abs(start_y - end_y) < 0.01:
-                    return
-                
-                dx = end_x - start_x
-                dy = end_y - start_y
-                distance = math.sqrt(dx*dx + dy*dy)
-                
-                if distance < 0.1:
-                    ax.plot([start_x, end_x], [start_y, end_y], color=color, linewidth=linewidth, alpha=0.8)
-                    return
-                
-                # 贝塞尔控制点计算
-                t = np.linspace(0, 1, 50)
+                    # Determine color
+                    if depth_level == 1:
+                        child_c = branch_colors[i % len(branch_colors)]
+                    else:
+                        child_c = inherited_color
+                    
+                    # Pass parent radius and size to ensure child is always further out
+                    child_items.append((child, x, y, child_start, child_end, depth_level + 1, child_c,
+                                        current_radius, current_size))
+                    
+                    current_angle += child_angle_step
                 
-                start_dist = math.sqrt(start_x**2 + start_y**2)
-                if start_dist > 0.001:
-                    norm_start_x, norm_start_y = start_x / start_dist, start_y / start_dist
-                else:
-                    norm_start_x, norm_start_y = dx / distance, dy / distance
+                # Reversed so the first child is popped (and placed) first
+                stack.extend(reversed(child_items))
+        
+        return layout_nodes
 
-                cp1_dist = distance * 0.4
-                cp1_x = start_x + norm_start_x * cp1_dist
-                cp1_y = start_y + norm_start_y * cp1_dist
-                
-                cp2_x = end_x - (end_x - start_x) * 0.4 
-                cp2_y = end_y - (end_y - start_y) * 0.4
-                
-                curve_x = (1-t)**3 * start_x + 3*(1-t)**2*t * cp1_x + 3*(1-t)*t**2 * cp2_x + t**3 * end_x
-                curve_y = (1-t)**3 * start_y + 3*(1-t)**2*t * cp1_y + 3*(1-t)*t**2 * cp2_y + t**3 * end_y
-                
-                ax.plot(curve_x, curve_y, color=color, linewidth=linewidth, alpha=0.8)
-
-            # Draw lines first
-            for node in layout_nodes:
-                if node['depth'] > 1:
-                    # Draw line from parent
-                    line_width = max(3 - node['depth'] * 0.5, 1)
-                    draw_curved_branch_line(node['parent_x'], node['parent_y'], 
-                                          node['x'], node['y'], 
-                                          color=node['color'], linewidth=line_width)
-            
-            # Save base image (lines only)
-            plt.tight_layout(pad=0)
-            ax.set_position([0, 0, 1, 1]) # Occupy full figure
-            
-            temp_base_file = os.path.join(temp_dir, "base_center_mindmap.png")
-            plt.savefig(temp_base_file, dpi=dpi, facecolor='white', edgecolor='none', format='png')
-            plt.close()
-            
-            # Open with PIL to draw text
-            base_img = Image.open(temp_base_file)
-            draw = ImageDraw.Draw(base_img)
-            img_w, img_h = base_img.size
-            
-            # Coordinate transform: Data (min_x..max_x) -> Pixel (0..img_w)
-            x_range = (max_x + margin) - (min_x - margin)
-            y_range = (max_y + margin) - (min_y - margin)
-            
-            def data_to_pixel(x, y):
-                px = (x - (min_x - margin)) / x_range * img_w
-                py = img_h - (y - (min_y - margin)) / y_range * img_h # Flip Y
-                return px, py
-            
-            # Draw text
-            for node in layout_nodes:
-                px, py = data_to_pixel(node['x'], node['y'])
-                self._draw_text_with_pil(
-                    base_img, draw, px, py,
-                    node['text'], node['depth'], 
-                    node['color'], font_file
-                )
-            
-            base_img.save(output_file, 'PNG')
-            return True
-            
-        except Exception:
-            import traceback
-            traceback.print_exc()
-            return False
+    def _generate_png_mindmap(self, tree_data: dict) -> Optional[bytes]:
+        """
+        Generate PNG mind map with free structure layout (Collision-free Radial)
+        Returns the encoded PNG bytes, or None if there is nothing to draw.
+        Errors propagate to _invoke, which reports them to the caller.
+        """
+        # 设置PIL中文字体
+        font_file = self._setup_pil_chinese_font()
+        
+        if Image is None or np is None:
+            raise ImportError("Center mind map generation requires Pillow and numpy")
+        
+        # 预先测量所有节点文本，布局和绘制复用
+        self._precompute_text_sizes(tree_data, font_file)
+        
+        layout_nodes = self._layout_nodes(tree_data)
+        
+        # Calculate dynamic canvas size with enhanced margin
+        if not layout_nodes:
+            return None
+        
+        # Calculate bounding box with node dimensions (one array over all nodes)
+        boxes = np.array([(n['x'], n['y'], n['width'], n['height']) for n in layout_nodes], dtype=float)
+        xs, ys, ws, hs = boxes.T
+        min_x = float((xs - ws/2).min())
+        max_x = float((xs + ws/2).max())
+        min_y = float((ys - hs/2).min())
+        max_y = float((ys + hs/2).max())
+        
+        # Calculate maximum radius to ensure adequate space
+        # (node radius plus half of node diagonal to account for node size)
+        max_radius = float((np.hypot(xs, ys) + np.hypot(ws, hs) / 2).max())
+        
+        # Enhanced margin calculation based on maximum radius and depth
+        # Deeper structures need more margin
+        max_depth = max(n['depth'] for n in layout_nodes) if layout_nodes else 1
+        base_margin = 150
+        depth_margin = max_depth * 30  # Additional margin per depth level
+        margin = base_margin + depth_margin
+        
+        # Calculate canvas size with enhanced margin
+        total_width = max_x - min_x + 2 * margin
+        total_height = max_y - min_y + 2 * margin
+        
+        # Ensure minimum size based on maximum radius
+        min_size_from_radius = (max_radius + margin) * 2
+        total_width = max(total_width, min_size_from_radius, 1000)
+        total_height = max(total_height, min_size_from_radius, 800)
+        
+        # Canvas is drawn directly with PIL at one pixel per layout unit; very large
+        # layouts are drawn at a reduced scale instead of allocating the full-size image
+        img_w, img_h = int(total_width), int(total_height)
+        scale = _output_scale(img_w, img_h)
+        if scale < 1.0:
+            img_w, img_h = max(1, int(img_w * scale)), max(1, int(img_h * scale))
+        base_img = Image.new('RGB', (img_w, img_h), 'white')
+        draw = ImageDraw.Draw(base_img)
+        
+        # Coordinate transform: Data (min_x..max_x) -> Pixel (0..img_w)
+        x_range = (max_x + margin) - (min_x - margin)
+        y_range = (max_y + margin) - (min_y - margin)
+        
+        def data_to_pixel(x, y):
+            px = (x - (min_x - margin)) / x_range * img_w
+            py = img_h - (y - (min_y - margin)) / y_range * img_h # Flip Y
+            return px, py
+        
+        def line_fill(color, alpha=0.8):
+            """Branch color blended onto the white background"""
+            r, g, b = ImageColor.getrgb(color)[:3]
+            return tuple(int(round(c * alpha + 255 * (1 - alpha))) for c in (r, g, b))
+        
+        # Draw lines first: collect every branch edge and sample all Bezier curves at once
+        edges = [
+            n for n in layout_nodes
+            if n['depth'] > 1
+            and not (abs(n['parent_x'] - n['x']) < 0.01 and abs(n['parent_y'] - n['y']) < 0.01)
+        ]
+        if edges:
+            start = np.array([(n['parent_x'], n['parent_y']) for n in edges], dtype=float)
+            end = np.array([(n['x'], n['y']) for n in edges], dtype=float)
+            delta = end - start
+            distance = np.hypot(delta[:, 0], delta[:, 1])
+            start_dist = np.hypot(start[:, 0], start[:, 1])
+            
+            # 贝塞尔控制点计算：第一个控制点沿父节点径向方向
+            radial = (start_dist > 0.001)[:, None]
+            norm_start = np.where(
+                radial,
+                start / np.where(start_dist > 0.001, start_dist, 1)[:, None],
+                delta / np.where(distance > 0, distance, 1)[:, None]
+            )
+            cp1 = start + norm_start * (distance * 0.4)[:, None]
+            cp2 = end - delta * 0.4
+            
+            t = np.linspace(0, 1, 50)[None, :, None]
+            curves = ((1-t)**3 * start[:, None, :] + 3*(1-t)**2*t * cp1[:, None, :]
+                      + 3*(1-t)*t**2 * cp2[:, None, :] + t**3 * end[:, None, :])
+            
+            # Data -> pixel for all sampled points at once
+            curves[..., 0] = (curves[..., 0] - (min_x - margin)) / x_range * img_w
+            curves[..., 1] = img_h - (curves[..., 1] - (min_y - margin)) / y_range * img_h
+            
+            for node, curve, d in zip(edges, curves, distance):
+                # Very short edges are drawn as straight segments
+                points = curve if d >= 0.1 else curve[[0, -1]]
+                # Line widths were specified in points at 100 dpi
+                width = max(1, round(max(3 - node['depth'] * 0.5, 1) * 100 / 72 * scale))
+                draw.line([tuple(p) for p in points.tolist()],
+                          fill=line_fill(node['color']), width=width, joint='curve')
+        
+        # Draw text: collect every node box first, then draw boxes and labels in two passes
+        text_boxes = []
+        for node in layout_nodes:
+            px, py = data_to_pixel(node['x'], node['y'])
+            text_box = self._prepare_text_box(
+                base_img.size, draw, px, py,
+                node['text'], node['depth'], 
+                node['color'], font_file, bbox=node['bbox'], scale=scale
+            )
+            if text_box is not None:
+                text_boxes.append(text_box)
+        
+        # 绘制圆角矩形
+        radius = max(1, round(5 * scale))
+        for box, border_width, color, _, _, _, _ in text_boxes:
+            draw.rounded_rectangle(box, radius=radius, fill='white', outline=color, width=border_width)
+        
+        # 文本居中
+        for _, _, color, (x, y), text, font, bbox in text_boxes:
+            try:
+                draw.text((x, y), text, font=font, fill=color, anchor='mm')
+            except TypeError:
+                text_x = x - (bbox[2] - bbox[0]) / 2
+                text_y = y - (bbox[1] + (bbox[3] - bbox[1]) / 2)
+                draw.text((text_x, text_y), text, font=font, fill=color)
+        
+        buffer = BytesIO()
+        base_img.save(buffer, 'PNG')
+        return buffer.getvalue()
 
     def _invoke(self, tool_parameters: dict) -> Generator[Dict[str, Any], None, None]:
         """
@@ -665,53 +725,48 @@ class MindMapCenterTool:
             if not display_filename.endswith('.png'):
                 display_filename += '.png'
             
-            with tempfile.TemporaryDirectory() as temp_dir:
-                temp_output_path = os.path.join(temp_dir, display_filename)
+            tree_data = parse_cached(self._parse_markdown_to_tree, markdown_content)
+            tree_depth, total_nodes = self._calculate_tree_metrics(tree_data)
+            png_data = self._generate_png_mindmap(tree_data)
+            
+            if png_data:
+                file_size = len(png_data)
+                size_mb = file_size / (1024 * 1024)
+                size_text = f"{size_mb:.2f}M"
                 
-                tree_data = self._parse_markdown_to_tree(markdown_content)
-                success = self._generate_png_mindmap(tree_data, temp_output_path, temp_dir)
+                blob_message = self.create_blob_message(
+                    blob=png_data,
+                    meta={'mime_type': 'image/png', 'filename': display_filename}
+                )
                 
-                if success and os.path.exists(temp_output_path):
-                    with open(temp_output_path, 'rb') as f:
-                        png_data = f.read()
-                    
-                    file_size = len(png_data)
-                    size_mb = file_size / (1024 * 1024)
-                    size_text = f"{size_mb:.2f}M"
-                    
-                    blob_message = self.create_blob_message(
-                        blob=png_data,
-                        meta={'mime_type': 'image/png', 'filename': display_filename}
-                    )
-                    
-                    json_data = {
-                        "layout_type": "center",
-                        "file_size_mb": round(size_mb, 2),
-                        "tree_depth": self._calculate_tree_depth(tree_data),
-                        "total_nodes": len(self._get_all_nodes(tree_data)),
-                        "filename": display_filename,
-                        "generation_time": time.strftime("%Y-%m-%d %H:%M:%S"),
-                        "success": True,
-                        "file_info": {
-                            "type": "image",
-                            "mime_type": "image/png",
-                            "size": file_size,
-                            "filename": display_filename
-                        }
+                json_data = {
+                    "layout_type": "center",
+                    "file_size_mb": round(size_mb, 2),
+                    "tree_depth": tree_depth,
+                    "total_nodes": total_nodes,
+                    "filename": display_filename,
+                    "generation_time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "success": True,
+                    "file_info": {
+                        "type": "image",
+                        "mime_type": "image/png",
+                        "size": file_size,
+                        "filename": display_filename
                     }
-                    
-                    yield blob_message
-                    yield self.create_text_message(f'Center mind map generation successful! File size: {size_text}')
-                    yield self.create_json_message(json_data)
-                else:
-                    json_data = {
-                        "layout_type": "center",
-                        "success": False,
-                        "error": "Unable to create image file"
-                    }
-                    yield self.create_text_message('Center mind map generation failed: Unable to create image file.')
-                    yield self.create_json_message(json_data)
-        
+                }
+                
+                yield blob_message
+                yield self.create_text_message(f'Center mind map generation successful! File size: {size_text}')
+                yield self.create_json_message(json_data)
+            else:
+                json_data = {
+                    "layout_type": "center",
+                    "success": False,
+                    "error": "Unable to create image file"
+                }
+                yield self.create_text_message('Center mind map generation failed: Unable to create image file.')
+                yield self.create_json_message(json_data)
+    
         except Exception as e:
             error_msg = str(e)
             json_data = {
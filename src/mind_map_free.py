@@ -15,6 +15,8 @@ import math
 import shutil
 from typing import Any, Dict, Generator, List, Tuple
 
+from ._parse import parse_cached
+
 class MindMapFreeTool:
     
     def create_text_message(self, text: str) -> Dict[str, Any]:
@@ -231,7 +233,7 @@ class MindMapFreeTool:
             
             # Load font
             font = None
-            if font_file and os.path.exists(font_file):
+            if font_file:
                 try:
                     font = ImageFont.truetype(font_file, font_size)
                 except Exception:
@@ -305,7 +307,7 @@ class MindMapFreeTool:
             font_size = max(base_font_size - (depth_level * 6), 24)
             
             font = None
-            if font_file and os.path.exists(font_file):
+            if font_file:
                 try:
                     font = ImageFont.truetype(font_file, font_size)
                 except Exception:
@@ -573,8 +575,7 @@ class MindMapFreeTool:
             fig_width = total_width / dpi
             fig_height = total_height / dpi
             
-            # Re-create figure with calculated size
-            plt.close() # Close initial dummy figure
+            # Create figure with calculated size
             fig, ax = plt.subplots(1, 1, figsize=(fig_width, fig_height), dpi=dpi)
             
             # Set limits to match our coordinate system
@@ -627,15 +628,14 @@ class MindMapFreeTool:
                                           color=node['color'], linewidth=line_width)
             
             # Save base image (lines only)
-            plt.tight_layout(pad=0)
             ax.set_position([0, 0, 1, 1]) # Occupy full figure
             
-            temp_base_file = os.path.join(temp_dir, "base_center_mindmap.png")
-            plt.savefig(temp_base_file, dpi=dpi, facecolor='white', edgecolor='none', format='png')
-            plt.close()
+            # Render the figure straight to an in-memory RGBA buffer (no temp PNG round trip)
+            fig.canvas.draw()
+            base_img = Image.fromarray(np.asarray(fig.canvas.buffer_rgba()))
+            plt.close(fig)
             
-            # Open with PIL to draw text
-            base_img = Image.open(temp_base_file)
+            # Draw text with PIL on top of the rendered lines
             draw = ImageDraw.Draw(base_img)
             img_w, img_h = base_img.size
             
@@ -770,12 +770,12 @@ class MindMapFreeTool:
             nodes.extend(self._get_all_nodes_with_coords(child))
         return nodes
 
-    def _draw_bezier_curve(self, ax, start_x, start_y, end_x, end_y, 
-                          visual_start_x, visual_end_x, color, linewidth):
+    def _draw_bezier_curve(self, segments, start_x, start_y, end_x, end_y, 
+                          visual_start_x, visual_end_x):
         import numpy as np
         
-        dist = math.sqrt((visual_end_x - visual_start_x)**2 + (end_y - start_y)**2)
-        h_dist = abs(visual_end_x - visual_start_x)
+        # Children always sit right of the parent's visual edge, so no abs() is needed
+        h_dist = visual_end_x - visual_start_x
         
         cp_dist = min(h_dist * 0.6, 4.0)
         
@@ -788,9 +788,10 @@ class MindMapFreeTool:
         x = (1-t)**3 * start_x + 3*(1-t)**2*t * cp1_x + 3*(1-t)*t**2 * cp2_x + t**3 * end_x
         y = (1-t)**3 * start_y + 3*(1-t)**2*t * cp1_y + 3*(1-t)*t**2 * cp2_y + t**3 * end_y
         
-        ax.plot(x, y, color=color, linewidth=linewidth, alpha=0.7)
+        segments.append(np.column_stack((x, y)))
 
-    def _draw_horizontal_lines(self, ax, node):
+    def _draw_horizontal_lines(self, node, segments, colors, widths):
+        """Accumulate connector curves; they are added to the axes as one LineCollection"""
         children = node.get('children', [])
         if not children:
             return
@@ -808,14 +809,13 @@ class MindMapFreeTool:
             visual_end_x = end_x - (child_width / 2)
             line_end_x = end_x - (child_width / 2) * 0.6
             
-            color = child['color']
-            linewidth = max(3 - child['depth'] * 0.3, 1)
+            colors.append(child['color'])
+            widths.append(max(3 - child['depth'] * 0.3, 1))
             
-            self._draw_bezier_curve(ax, line_start_x, start_y, line_end_x, end_y, 
-                                  visual_start_x, visual_end_x,
-                                  color, linewidth)
+            self._draw_bezier_curve(segments, line_start_x, start_y, line_end_x, end_y, 
+                                  visual_start_x, visual_end_x)
             
-            self._draw_horizontal_lines(ax, child)
+            self._draw_horizontal_lines(child, segments, colors, widths)
 
     def _generate_horizontal_layout(self, tree_data: dict, output_file: str, temp_dir: str) -> bool:
         """
@@ -827,6 +827,7 @@ class MindMapFreeTool:
             import matplotlib
             matplotlib.use('Agg')
             import matplotlib.pyplot as plt
+            from matplotlib.collections import LineCollection
             import numpy as np
             from PIL import Image, ImageDraw
             
@@ -872,24 +873,25 @@ class MindMapFreeTool:
             if fig_width > 200: fig_width = 200
             if fig_height > 200: fig_height = 200
             
-            plt.close('all')
             fig, ax = plt.subplots(1, 1, figsize=(fig_width, fig_height), dpi=100)
             ax.set_xlim(min_x - margin_x, max_x + margin_x)
             ax.set_ylim(min_y - margin_y, max_y + margin_y)
             ax.axis('off')
             
-            # 4. Draw Lines
-            self._draw_horizontal_lines(ax, tree_data)
+            # 4. Draw Lines (one artist for every connector)
+            segments, colors, widths = [], [], []
+            self._draw_horizontal_lines(tree_data, segments, colors, widths)
+            if segments:
+                ax.add_collection(LineCollection(segments, colors=colors, linewidths=widths, alpha=0.7))
             
-            plt.tight_layout(pad=0)
             ax.set_position([0, 0, 1, 1])
             
-            temp_base_file = os.path.join(temp_dir, "base_horizontal.png")
-            plt.savefig(temp_base_file, dpi=100, facecolor='white', edgecolor='none', format='png')
-            plt.close()
+            # Render the figure straight to an in-memory RGBA buffer (no temp PNG round trip)
+            fig.canvas.draw()
+            base_img = Image.fromarray(np.asarray(fig.canvas.buffer_rgba()))
+            plt.close(fig)
             
             # 5. Draw Text
-            base_img = Image.open(temp_base_file)
             draw = ImageDraw.Draw(base_img)
             img_w, img_h = base_img.size
             
@@ -937,7 +939,7 @@ class MindMapFreeTool:
                 temp_output_path = os.path.join(temp_dir, display_filename)
                 
                 # Parse Markdown
-                tree_data = self._parse_markdown_to_tree(markdown_content)
+                tree_data = parse_cached(self._parse_markdown_to_tree, markdown_content)
                 
                 # Analyze Structure
                 layout_mode = self._analyze_structure_complexity(tree_data)
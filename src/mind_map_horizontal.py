@@ -10,13 +10,72 @@ Features:
 - PIL-based Chinese font support
 """
 
+import logging
 import os
 import re
-import tempfile
 import time
 import math
 import shutil
-from typing import Any, Dict, Generator, List
+from functools import lru_cache
+from io import BytesIO
+from typing import Any, Dict, Generator, List, Optional
+
+from ._parse import parse_cached
+
+# Markdown tokens used by the parser and the text cleaner
+_BULLET_MARKERS = frozenset('-*+')
+_RE_BOLD = re.compile(r'\*\*(.*?)\*\*')
+_RE_ITALIC = re.compile(r'\*(.*?)\*')
+
+# Canvases larger than this many pixels are drawn at a reduced scale, but labels are
+# not shrunk below _MIN_FONT_PX (the smallest unscaled label font is 24px); the canvas
+# grows instead, up to _HARD_MAX_OUTPUT_PIXELS
+_MAX_OUTPUT_PIXELS = 16_000_000
+_HARD_MAX_OUTPUT_PIXELS = 64_000_000
+_MIN_FONT_PX = 12
+_MIN_TEXT_SCALE = _MIN_FONT_PX / 24
+
+logger = logging.getLogger("mind-map-mcp")
+
+def _output_scale(img_w: int, img_h: int) -> float:
+    """Draw scale for an img_w x img_h layout under the output pixel limits"""
+    pixels = img_w * img_h
+    if pixels <= _MAX_OUTPUT_PIXELS:
+        return 1.0
+    scale = max(math.sqrt(_MAX_OUTPUT_PIXELS / pixels), _MIN_TEXT_SCALE)
+    if pixels * scale * scale > _HARD_MAX_OUTPUT_PIXELS:
+        scale = math.sqrt(_HARD_MAX_OUTPUT_PIXELS / pixels)
+        logger.warning("Mind map of %dx%d px drawn at %.0f%% scale; smallest labels are about %dpx",
+                       img_w, img_h, scale * 100, round(24 * scale))
+    else:
+        logger.info("Mind map of %dx%d px drawn at %.0f%% scale", img_w, img_h, scale * 100)
+    return scale
+
+# (font_size, padding, border_width) for depths 1..10; deeper levels reuse the last entry
+_DEPTH_STYLES = tuple(
+    (max(42 - depth * 6, 24), max(18 - depth * 2, 10), 4 if depth == 1 else 3)
+    for depth in range(1, 11)
+)
+
+class _Node:
+    """Mind map node; slotted to keep per-node memory and attribute access cheap"""
+    __slots__ = ('content', 'level', 'children', 'width', 'subtree_height',
+                 'children_block_height', 'subtree_depth', 'subtree_size',
+                 'x', 'y', 'depth', 'color')
+    
+    def __init__(self, content: str, level: int, children: List['_Node'] = None):
+        self.content = content
+        self.level = level
+        self.children = children if children is not None else []
+        self.width = 0.0
+        self.subtree_height = 1.0
+        self.children_block_height = 0.0
+        self.subtree_depth = 1
+        self.subtree_size = 1
+        self.x = 0.0
+        self.y = 0.0
+        self.depth = 1
+        self.color = '#333333'
 
 class MindMapHorizontalTool:
     
@@ -29,10 +88,16 @@ class MindMapHorizontalTool:
     def create_json_message(self, data: Dict[str, Any]) -> Dict[str, Any]:
         return {"type": "json", "data": data}
 
-    def _setup_pil_chinese_font(self, temp_dir):
+    def _setup_pil_chinese_font(self):
         """
         使用PIL/Pillow进行中文字体处理的解决方案 - 优先使用嵌入字体
         """
+        return self._find_font_file()
+
+    @staticmethod
+    @lru_cache(maxsize=1)
+    def _find_font_file():
+        """字体路径在进程内不会变化，只查找一次"""
         try:
             from PIL import Image, ImageDraw, ImageFont
         except ImportError:
@@ -85,7 +150,7 @@ class MindMapHorizontalTool:
         
         return font_file
     
-    def _parse_markdown_to_tree(self, markdown_text: str) -> dict:
+    def _parse_markdown_to_tree(self, markdown_text: str) -> _Node:
         """
         Universal Markdown parser
         """
@@ -99,37 +164,37 @@ class MindMapHorizontalTool:
             line = line.rstrip()
             if not line or line.startswith('```'):
                 continue
-                
-            level = 0
-            content = ""
+            
+            # 单次扫描：按去除缩进后的首字符分派行类型
+            stripped = line.lstrip()
+            leading_spaces = len(line) - len(stripped)
+            first = stripped[0]
             is_header = False
+            is_bullet = False
             
-            if line.startswith('#'):
-                header_count = 0
-                for char in line:
-                    if char == '#':
-                        header_count += 1
-                    else:
-                        break
-                level = header_count
-                content = line[header_count:].strip()
+            if first == '#' and not leading_spaces:
+                level = len(stripped) - len(stripped.lstrip('#'))
+                content = stripped[level:].strip()
                 is_header = True
                 last_header_level = level
                 
-            elif re.match(r'^\s*\d+\.\s+', line):
-                leading_spaces = len(line) - len(line.lstrip())
+            elif first.isdecimal():
+                # Ordered list: digits, '.', then whitespace
+                i = 1
+                while i < len(stripped) and stripped[i].isdecimal():
+                    i += 1
+                if not stripped.startswith('.', i) or not stripped[i + 1:i + 2].isspace():
+                    continue
                 level = leading_spaces // 2 + 2
-                content = re.sub(r'^\s*\d+\.\s*', '', line)
-                content = self._clean_markdown_text(content)
+                content = self._clean_markdown_text(stripped[i + 1:])
                 
-            elif re.match(r'^\s*[-\*\+]\s+', line):
-                leading_spaces = len(line) - len(line.lstrip())
+            elif first in _BULLET_MARKERS and stripped[1:2].isspace():
+                is_bullet = True
                 if leading_spaces == 0 and last_header_level > 0:
                     level = last_header_level + 1
                 else:
                     level = leading_spaces // 2 + 2
-                content = re.sub(r'^\s*[-\*\+]\s*', '', line)
-                content = self._clean_markdown_text(content)
+                content = self._clean_markdown_text(stripped[1:])
                 
             else:
                 continue
@@ -137,56 +202,41 @@ class MindMapHorizontalTool:
             if not content:
                 continue
                 
-            node = {
-                'content': content,
-                'level': level,
-                'children': []
-            }
+            node = _Node(content, level)
             
-            if not is_header and not re.match(r'^\s*[-\*\+]\s+', line):
+            if not is_header and not is_bullet:
                 last_header_level = 0
             
-            while node_stack and node_stack[-1]['level'] >= level:
+            while node_stack and node_stack[-1].level >= level:
                 node_stack.pop()
             
             if node_stack:
-                node_stack[-1]['children'].append(node)
+                node_stack[-1].children.append(node)
             else:
                 nodes.append(node)
             
             node_stack.append(node)
         
         if not nodes:
-            return {'content': 'Mind Map', 'level': 1, 'children': []}
+            return _Node('Mind Map', 1)
             
         if len(nodes) == 1:
             return nodes[0]
         
-        return {
-            'content': 'Mind Map',
-            'level': 1, 
-            'children': nodes
-        }
+        return _Node('Mind Map', 1, nodes)
 
     def _clean_markdown_text(self, text: str) -> str:
-        text = re.sub(r'\*\*(.*?)\*\*', r'\1', text)
-        text = re.sub(r'\*(.*?)\*', r'\1', text)
+        # Plain labels skip the emphasis patterns entirely
+        if '*' in text:
+            text = _RE_BOLD.sub(r'\1', text)
+            # 斜体去除后至多剩下一个 '*'，因此不再需要单独处理 "**x**:" 形式
+            text = _RE_ITALIC.sub(r'\1', text)
         text = text.replace('《', '').replace('》', '')
-        text = re.sub(r'\*\*(.*?)\*\*:\s*', r'\1: ', text)
         return text.strip()
 
-    def _calculate_tree_depth(self, node: dict) -> int:
-        if not node.get('children'):
-            return 1
-        return 1 + max(self._calculate_tree_depth(child) for child in node['children'])
-
-    def _get_all_nodes(self, node: dict) -> list:
-        nodes = [node]
-        for child in node.get('children', []):
-            nodes.extend(self._get_all_nodes(child))
-        return nodes
-    
-    def _estimate_text_width(self, text: str, depth_level: int) -> float:
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _estimate_text_width(text: str, depth_level: int) -> float:
         """
         Estimate text width in coordinate units.
         This maps text length + font size to our abstract coordinate system.
@@ -199,12 +249,8 @@ class MindMapHorizontalTool:
         # Rough character width estimation
         # Chinese/Wide chars: 1.0 width
         # ASCII/Narrow chars: 0.6 width
-        width_score = 0
-        for char in text:
-            if ord(char) > 127:
-                width_score += 1.0
-            else:
-                width_score += 0.6
+        ascii_count = sum(1 for char in text if char.isascii())
+        width_score = (len(text) - ascii_count) * 1.0 + ascii_count * 0.6
         
         # Font scale factor decreases with depth
         # Level 1: Scale 1.0
@@ -221,167 +267,176 @@ class MindMapHorizontalTool:
         
         return estimated_width
 
-    def _calculate_subtree_layout_data(self, node: dict, depth_level: int = 1) -> float:
+    def _calculate_subtree_layout_data(self, root: _Node) -> float:
         """
         Pass 1: Calculate vertical height AND estimate horizontal width for each node.
+        Children are finished before their parent by walking the pre-order list backwards.
         """
-        children = node.get('children', [])
-        content = node.get('content', 'Node')
-        
-        # Calculate and store self width
-        node['_width'] = self._estimate_text_width(content, depth_level)
-        
         # Basic height unit
         base_node_height = 1.0
+        gap = 0.6
         
-        if not children:
-            node['_subtree_height'] = base_node_height
-            return base_node_height
-            
-        children_total_height = 0
-        for child in children:
-            children_total_height += self._calculate_subtree_layout_data(child, depth_level + 1)
+        order = []
+        stack = [(root, 1)]
+        while stack:
+            node, depth_level = stack.pop()
+            # Calculate and store self width
+            node.width = self._estimate_text_width(node.content, depth_level)
+            order.append(node)
+            for child in node.children:
+                stack.append((child, depth_level + 1))
+        
+        for node in reversed(order):
+            children = node.children
+            if not children:
+                node.subtree_height = base_node_height
+                node.subtree_depth = 1
+                node.subtree_size = 1
+                continue
             
-        gap = 0.6 
-        if len(children) > 1:
-            children_total_height += (len(children) - 1) * gap
+            children_total_height = sum(c.subtree_height for c in children)
+            if len(children) > 1:
+                children_total_height += (len(children) - 1) * gap
             
-        node['_subtree_height'] = max(base_node_height, children_total_height)
-        return node['_subtree_height']
+            # Depth and node count are accumulated here so _invoke needs no extra tree walks
+            node.subtree_depth = 1 + max(c.subtree_depth for c in children)
+            node.subtree_size = 1 + sum(c.subtree_size for c in children)
+            # Unclamped children block height (with gaps) is reused by pass 2
+            node.children_block_height = children_total_height
+            node.subtree_height = max(base_node_height, children_total_height)
+        
+        return root.subtree_height
 
-    def _assign_coordinates_to_tree(self, node, x, y_center, branch_colors, inherited_color, depth_level):
+    def _assign_coordinates_to_tree(self, root, branch_colors, out_list):
         """
         Pass 2: Assign coordinates using variable width for precise spacing.
+        Every positioned node is appended to out_list in pre-order.
         """
-        children = node.get('children', [])
-        
-        if depth_level == 1:
-            color = '#333333'
-        else:
-            color = inherited_color
-            
-        node['x'] = x
-        node['y'] = y_center
-        node['depth'] = depth_level
-        node['color'] = color
-        
-        if not children:
-            return
-            
-        # Calculate X position for children based on parent's actual width
-        # We need: Parent Half Width + Connector Length + Child Half Width (variable)
-        # Simplified: Parent Right Edge + Gap
-        
-        parent_width = node['_width']
         connector_length = 2.0 # Fixed minimum length for the curved line
+        gap = 0.6
         
-        max_child_width = 0
-        for child in children:
-            max_child_width = max(max_child_width, child['_width'])
+        # Root is centered at the origin; children are pushed in reverse to keep pre-order
+        stack = [(root, 0, 0, '#333333', 1)]
+        while stack:
+            node, x, y_center, color, depth_level = stack.pop()
+            if depth_level == 1:
+                color = '#333333'
             
-        dist_to_children = (parent_width / 2) + connector_length + (max_child_width / 2)
-        
-        child_x = x + dist_to_children
-        
-        # Calc Y positions
-        total_children_height = sum(c['_subtree_height'] for c in children)
-        gap = 0.6
-        if len(children) > 1:
-            total_children_height += (len(children) - 1) * gap
+            node.x = x
+            node.y = y_center
+            node.depth = depth_level
+            node.color = color
+            out_list.append(node)
             
-        current_y = y_center + total_children_height / 2
-        
-        for i, child in enumerate(children):
-            child_height = child['_subtree_height']
-            child_y_center = current_y - child_height / 2
+            children = node.children
+            if not children:
+                continue
             
-            if depth_level == 1:
-                child_color = branch_colors[i % len(branch_colors)]
-            else:
-                child_color = color
+            # Calculate X position for children based on parent's actual width
+            # We need: Parent Half Width + Connector Length + Child Half Width (variable)
+            max_child_width = max(child.width for child in children)
+            dist_to_children = (node.width / 2) + connector_length + (max_child_width / 2)
+            child_x = x + dist_to_children
+            
+            # Calc Y positions from the block height computed in pass 1
+            current_y = y_center + node.children_block_height / 2
+            placed = []
+            for i, child in enumerate(children):
+                child_height = child.subtree_height
+                
+                if depth_level == 1:
+                    child_color = branch_colors[i % len(branch_colors)]
+                else:
+                    child_color = color
                 
-            self._assign_coordinates_to_tree(child, child_x, child_y_center, 
-                                           branch_colors, child_color, depth_level + 1)
+                placed.append((child, child_x, current_y - child_height / 2, child_color, depth_level + 1))
+                current_y -= (child_height + gap)
             
-            current_y -= (child_height + gap)
-
-    def _get_all_nodes_with_coords(self, node):
-        """Flatten tree to list, ensuring coords exist"""
-        if 'x' not in node:
-            return []
-        nodes = [node]
-        for child in node.get('children', []):
-            nodes.extend(self._get_all_nodes_with_coords(child))
-        return nodes
+            stack.extend(reversed(placed))
 
-    def _draw_lines_recursive(self, ax, node):
-        children = node.get('children', [])
-        if not children:
-            return
-            
-        start_x, start_y = node['x'], node['y']
-        # Line starts from right edge of parent text box
-        parent_width = node['_width']
-        
-        # Visual edge (where the box ends visually)
-        visual_start_x = start_x + (parent_width / 2)
-        
-        # Actual line start (retracted into the box to ensure connection)
-        # Retract by 40% of half-width to be safe against width estimation errors
-        line_start_x = start_x + (parent_width / 2) * 0.6
-        
-        for child in children:
-            end_x, end_y = child['x'], child['y']
-            child_width = child['_width']
+    def _collect_connector_edges(self, root, edges):
+        """Collect every parent -> child connector as Bezier end/visual points, in pre-order"""
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            children = node.children
+            if not children:
+                continue
             
-            # Visual edge
-            visual_end_x = end_x - (child_width / 2)
+            start_x, start_y = node.x, node.y
+            # Line starts from right edge of parent text box
+            parent_width = node.width
             
-            # Actual line end (retracted)
-            line_end_x = end_x - (child_width / 2) * 0.6
+            # Visual edge (where the box ends visually)
+            visual_start_x = start_x + (parent_width / 2)
             
-            color = child['color']
-            linewidth = max(3 - child['depth'] * 0.3, 1)
+            # Actual line start (retracted into the box to ensure connection)
+            # Retract by 40% of half-width to be safe against width estimation errors
+            line_start_x = start_x + (parent_width / 2) * 0.6
             
-            # Draw bezier using both visual and actual points
-            self._draw_bezier_curve(ax, line_start_x, start_y, line_end_x, end_y, 
-                                  visual_start_x, visual_end_x,
-                                  color, linewidth)
+            for child in children:
+                end_x, end_y = child.x, child.y
+                child_width = child.width
+                
+                # Visual edge
+                visual_end_x = end_x - (child_width / 2)
+                
+                # Actual line end (retracted)
+                line_end_x = end_x - (child_width / 2) * 0.6
+                
+                linewidth = max(3 - child.depth * 0.3, 1)
+                
+                # Keep both visual and actual points for the bezier
+                edges.append((line_start_x, start_y, line_end_x, end_y,
+                              visual_start_x, visual_end_x, child.color, linewidth))
             
-            # Recurse
-            self._draw_lines_recursive(ax, child)
+            stack.extend(reversed(children))
 
-    def _draw_bezier_curve(self, ax, start_x, start_y, end_x, end_y, 
-                          visual_start_x, visual_end_x, color, linewidth):
+    def _draw_bezier_curves(self, draw, edges, to_px, scale=1.0):
+        """Sample all connector curves with one matrix product and draw them"""
         import numpy as np
+        from PIL import ImageColor
+        
+        if not edges:
+            return
+        
+        # Bezier basis weights depend only on t, shape (50, 4)
+        t = np.linspace(0, 1, 50)
+        basis = np.stack([(1-t)**3, 3*(1-t)**2*t, 3*(1-t)*t**2, t**3], axis=1)
+        
+        geometry = np.array([edge[:6] for edge in edges], dtype=float)
+        start_x, start_y, end_x, end_y, visual_start_x, visual_end_x = geometry.T
         
         # Calculate control points based on VISUAL boundaries for correct curvature shape
         # If we used retracted points, the curve might bend inside the box
         
-        dist = math.sqrt((visual_end_x - visual_start_x)**2 + (end_y - start_y)**2)
-        h_dist = abs(visual_end_x - visual_start_x)
+        # Children always sit right of the parent's visual edge, so no abs() is needed
+        h_dist = visual_end_x - visual_start_x
         
         # Control points extending from visual edges
-        cp_dist = min(h_dist * 0.6, 4.0)
-        
-        cp1_x = visual_start_x + cp_dist
-        cp1_y = start_y
+        cp_dist = np.minimum(h_dist * 0.6, 4.0)
         
-        cp2_x = visual_end_x - cp_dist
-        cp2_y = end_y
-        
-        # Generate curve points
-        t = np.linspace(0, 1, 50)
+        control_x = np.stack([start_x, visual_start_x + cp_dist, visual_end_x - cp_dist, end_x], axis=1)
+        control_y = np.stack([start_y, start_y, end_y, end_y], axis=1)
         
-        # Bezier formula
-        x = (1-t)**3 * start_x + 3*(1-t)**2*t * cp1_x + 3*(1-t)*t**2 * cp2_x + t**3 * end_x
-        y = (1-t)**3 * start_y + 3*(1-t)**2*t * cp1_y + 3*(1-t)*t**2 * cp2_y + t**3 * end_y
+        # (E, 4) @ (4, 50) -> 50 curve points per edge
+        px, py = to_px(control_x @ basis.T, control_y @ basis.T)
         
-        ax.plot(x, y, color=color, linewidth=linewidth, alpha=0.7)
+        fills = {}
+        for (*_, color, linewidth), xs, ys in zip(edges, px.tolist(), py.tolist()):
+            if color not in fills:
+                # alpha=0.7 的线条颜色预先与白色背景混合
+                r, g, b = ImageColor.getrgb(color)[:3]
+                fills[color] = tuple(int(round(c * 0.7 + 255 * 0.3)) for c in (r, g, b))
+            
+            # Line widths were specified in points at 100 dpi
+            width = max(1, round(linewidth * 100 / 72 * scale))
+            draw.line(list(zip(xs, ys)), fill=fills[color], width=width, joint='curve')
 
-    def _draw_text_with_pil(self, img, draw, x, y, text, depth_level, color, font_file):
+    def _prepare_text_box(self, x, y, text, depth_level, color, font_file, font_cache, scale=1.0):
         """
-        Draw text using PIL with high quality rendering
+        计算节点背景框和文本的绘制参数（绘制在 _generate_png_mindmap 中批量进行）
+        Returns (box, border_width, color, (x, y), text, font, text_size), or None if nothing should be drawn
         """
         try:
             from PIL import ImageFont
@@ -390,31 +445,41 @@ class MindMapHorizontalTool:
             if not safe_text:
                 safe_text = f"Node"
             
-            # Dynamic font size (unified with center layout)
-            base_font_size = 42
-            font_size = max(base_font_size - (depth_level * 6), 24)
-            
-            font = None
-            if font_file and os.path.exists(font_file):
-                try:
-                    font = ImageFont.truetype(font_file, font_size)
-                except Exception:
-                    pass
-            
-            if font is None:
-                try:
-                    font = ImageFont.load_default()
-                except:
-                    return
-            
-            # Measure text
-            bbox = draw.textbbox((0, 0), safe_text, font=font)
-            text_width = bbox[2] - bbox[0]
-            text_height = bbox[3] - bbox[1]
+            # Font size, padding and border by depth (unified with center layout)
+            font_size, padding, border_width = _DEPTH_STYLES[min(depth_level, len(_DEPTH_STYLES)) - 1]
+            if scale < 1.0:
+                font_size = max(1, round(font_size * scale))
+                padding = max(1, round(padding * scale))
+                border_width = max(1, round(border_width * scale))
+            
+            # 同一字号的字体和行高只加载/计算一次
+            key = (font_file, font_size)
+            cached = font_cache.get(key)
+            if cached is None:
+                font = None
+                if font_file:
+                    try:
+                        font = ImageFont.truetype(font_file, font_size)
+                    except Exception:
+                        pass
+                
+                if font is None:
+                    try:
+                        font = ImageFont.load_default()
+                    except:
+                        return None
+                
+                # Line height is constant per font; bitmap fonts have no getmetrics()
+                if hasattr(font, 'getmetrics'):
+                    ascent, descent = font.getmetrics()
+                    line_height = ascent + descent
+                else:
+                    line_height = font.getbbox('Ag')[3]
+                cached = font_cache[key] = (font, line_height)
+            font, text_height = cached
             
-            # Padding (unified with center layout)
-            padding = max(18 - depth_level * 2, 10)
-            border_width = 4 if depth_level == 1 else 3
+            # Measure text: advance width only, no full bbox layout
+            text_width = int(font.getlength(safe_text))
             
             box_width = text_width + 2 * padding
             box_height = text_height + 2 * padding
@@ -424,32 +489,21 @@ class MindMapHorizontalTool:
             box_x2 = x + box_width // 2
             box_y2 = y + box_height // 2
             
-            # Draw background
-            draw.rounded_rectangle([box_x1, box_y1, box_x2, box_y2], 
-                                 radius=6, fill='white', outline=color, width=border_width)
-            
-            # Draw text centered
-            try:
-                draw.text((x, y), safe_text, font=font, fill=color, anchor='mm')
-            except TypeError:
-                text_x = x - text_width / 2
-                text_y = y - (bbox[1] + text_height / 2)
-                draw.text((text_x, text_y), safe_text, font=font, fill=color)
+            return ([box_x1, box_y1, box_x2, box_y2], border_width, color, (x, y),
+                    safe_text, font, (text_width, text_height))
                 
         except Exception:
-            pass
+            return None
 
-    def _generate_png_mindmap(self, tree_data: dict, output_file: str, temp_dir: str) -> bool:
+    def _generate_png_mindmap(self, tree_data: _Node) -> Optional[bytes]:
         """
-        Generate PNG mind map using optimized layout engine
+        Generate PNG mind map using optimized layout engine, returned as PNG bytes
         """
         try:
             # Setup fonts
-            font_file = self._setup_pil_chinese_font(temp_dir)
+            font_file = self._setup_pil_chinese_font()
+            self._font_cache = {}
             
-            import matplotlib
-            matplotlib.use('Agg')
-            import matplotlib.pyplot as plt
             import numpy as np
             from PIL import Image, ImageDraw
             
@@ -461,28 +515,25 @@ class MindMapHorizontalTool:
                 '#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FECA57', '#FF9FF3', 
                 '#54A0FF', '#5F27CD', '#00D2D3', '#FF9F43', '#EE5A24', '#0984E3'
             ]
-            self._assign_coordinates_to_tree(tree_data, 0, 0, branch_colors, '#333333', 1)
+            all_nodes = []
+            self._assign_coordinates_to_tree(tree_data, branch_colors, all_nodes)
             
-            # 3. Collect nodes for determining canvas size
-            all_nodes = self._get_all_nodes_with_coords(tree_data)
+            # 3. Positioned nodes determine the canvas size
             if not all_nodes:
-                return False
+                return None
             
             # Calculate exact bounding box including text widths
-            min_x = float('inf')
-            max_x = float('-inf')
-            min_y = float('inf')
-            max_y = float('-inf')
-            
-            for n in all_nodes:
-                half_w = n['_width'] / 2
-                # Height is roughly fixed/estimated as 1.0 unit for calculation
-                half_h = 0.5 
-                
-                min_x = min(min_x, n['x'] - half_w)
-                max_x = max(max_x, n['x'] + half_w)
-                min_y = min(min_y, n['y'] - half_h)
-                max_y = max(max_y, n['y'] + half_h)
+            count = len(all_nodes)
+            xs = np.fromiter((n.x for n in all_nodes), dtype=float, count=count)
+            ys = np.fromiter((n.y for n in all_nodes), dtype=float, count=count)
+            half_ws = np.fromiter((n.width for n in all_nodes), dtype=float, count=count) / 2
+            # Height is roughly fixed/estimated as 1.0 unit for calculation
+            half_h = 0.5
+            
+            min_x = float((xs - half_ws).min())
+            max_x = float((xs + half_ws).max())
+            min_y = float(ys.min()) - half_h
+            max_y = float(ys.max()) + half_h
             
             # Add margins
             margin_x = 2.0
@@ -501,27 +552,16 @@ class MindMapHorizontalTool:
             if fig_width > 200: fig_width = 200
             if fig_height > 200: fig_height = 200
             
-            plt.close('all')
-            fig, ax = plt.subplots(1, 1, figsize=(fig_width, fig_height), dpi=100)
-            ax.set_xlim(min_x - margin_x, max_x + margin_x)
-            ax.set_ylim(min_y - margin_y, max_y + margin_y)
-            ax.axis('off')
-            
-            # 4. Draw Lines
-            self._draw_lines_recursive(ax, tree_data)
-            
-            # 5. Save Base Image
-            plt.tight_layout(pad=0)
-            ax.set_position([0, 0, 1, 1])
+            # 4. Create canvas directly with PIL (100 px per inch)
+            img_w, img_h = int(fig_width * 100), int(fig_height * 100)
             
-            temp_base_file = os.path.join(temp_dir, "base_horizontal.png")
-            plt.savefig(temp_base_file, dpi=100, facecolor='white', edgecolor='none')
-            plt.close()
-            
-            # 6. Draw Text with PIL
-            base_img = Image.open(temp_base_file)
+            # Very large trees are drawn at a reduced scale (labels, padding and lines
+            # shrink with the canvas) instead of allocating the full-size image
+            scale = _output_scale(img_w, img_h)
+            if scale < 1.0:
+                img_w, img_h = max(1, int(img_w * scale)), max(1, int(img_h * scale))
+            base_img = Image.new('RGB', (img_w, img_h), 'white')
             draw = ImageDraw.Draw(base_img)
-            img_w, img_h = base_img.size
             
             x_range = (max_x + margin_x) - (min_x - margin_x)
             y_range = (max_y + margin_y) - (min_y - margin_y)
@@ -530,20 +570,43 @@ class MindMapHorizontalTool:
                 px = (x - (min_x - margin_x)) / x_range * img_w
                 py = img_h - (y - (min_y - margin_y)) / y_range * img_h
                 return px, py
-                
-            for node in all_nodes:
-                px, py = to_px(node['x'], node['y'])
-                self._draw_text_with_pil(base_img, draw, px, py, 
-                                       node['content'], node['depth'], 
-                                       node['color'], font_file)
-                                       
-            base_img.save(output_file, 'PNG')
-            return True
+            
+            # 5. Draw Lines
+            edges = []
+            self._collect_connector_edges(tree_data, edges)
+            self._draw_bezier_curves(draw, edges, to_px, scale)
+            
+            # 6. Draw Text with PIL (all node centers transformed at once)
+            # Collect every node box first, then draw boxes and labels in two passes
+            node_px, node_py = to_px(xs, ys)
+            text_boxes = []
+            for node, px, py in zip(all_nodes, node_px.tolist(), node_py.tolist()):
+                text_box = self._prepare_text_box(px, py, node.content, node.depth, 
+                                                  node.color, font_file, self._font_cache, scale)
+                if text_box is not None:
+                    text_boxes.append(text_box)
+            
+            # 绘制圆角矩形背景
+            radius = max(1, round(6 * scale))
+            for box, border_width, color, _, _, _, _ in text_boxes:
+                draw.rounded_rectangle(box, radius=radius, fill='white', outline=color, width=border_width)
+            
+            # 文本居中
+            for _, _, color, (x, y), text, font, (text_width, text_height) in text_boxes:
+                try:
+                    draw.text((x, y), text, font=font, fill=color, anchor='mm')
+                except TypeError:
+                    draw.text((x - text_width / 2, y - text_height / 2), text, font=font, fill=color)
+            
+            # Encode in memory; zlib level 1 trades a little size for a much faster encode
+            buffer = BytesIO()
+            base_img.save(buffer, 'PNG', optimize=False, compress_level=1)
+            return buffer.getvalue()
             
         except Exception as e:
             import traceback
             traceback.print_exc()
-            return False
+            return None
 
     def _invoke(self, tool_parameters: dict) -> Generator[Dict[str, Any], None, None]:
         """
@@ -562,41 +625,35 @@ class MindMapHorizontalTool:
             if not display_filename.endswith('.png'):
                 display_filename += '.png'
             
-            with tempfile.TemporaryDirectory() as temp_dir:
-                temp_output_path = os.path.join(temp_dir, display_filename)
+            tree_data = parse_cached(self._parse_markdown_to_tree, markdown_content)
+            
+            png_data = self._generate_png_mindmap(tree_data)
+            
+            if png_data:
+                file_size = len(png_data)
+                size_mb = file_size / (1024 * 1024)
+                size_text = f"{size_mb:.2f}M"
                 
-                tree_data = self._parse_markdown_to_tree(markdown_content)
+                blob_message = self.create_blob_message(
+                    blob=png_data,
+                    meta={'mime_type': 'image/png', 'filename': display_filename}
+                )
                 
-                success = self._generate_png_mindmap(tree_data, temp_output_path, temp_dir)
+                json_data = {
+                    "layout_type": "horizontal_optimized",
+                    "file_size_mb": round(size_mb, 2),
+                    "tree_depth": tree_data.subtree_depth,
+                    "total_nodes": tree_data.subtree_size,
+                    "filename": display_filename,
+                    "success": True
+                }
                 
-                if success and os.path.exists(temp_output_path):
-                    with open(temp_output_path, 'rb') as f:
-                        png_data = f.read()
-                    
-                    file_size = len(png_data)
-                    size_mb = file_size / (1024 * 1024)
-                    size_text = f"{size_mb:.2f}M"
-                    
-                    blob_message = self.create_blob_message(
-                        blob=png_data,
-                        meta={'mime_type': 'image/png', 'filename': display_filename}
-                    )
-                    
-                    json_data = {
-                        "layout_type": "horizontal_optimized",
-                        "file_size_mb": round(size_mb, 2),
-                        "tree_depth": self._calculate_tree_depth(tree_data),
-                        "total_nodes": len(self._get_all_nodes(tree_data)),
-                        "filename": display_filename,
-                        "success": True
-                    }
-                    
-                    yield blob_message
-                    yield self.create_text_message(f'Horizontal mind map generated successfully! Size: {size_text}')
-                    yield self.create_json_message(json_data)
-                else:
-                    yield self.create_text_message('Generation failed: Unable to create image file.')
-        
+                yield blob_message
+                yield self.create_text_message(f'Horizontal mind map generated successfully! Size: {size_text}')
+                yield self.create_json_message(json_data)
+            else:
+                yield self.create_text_message('Generation failed: Unable to create image file.')
+    
         except Exception as e:
             yield self.create_text_message(f'Generation failed: {str(e)}')
 
@@ -0,0 +1,465 @@
+"""
+Mind Map MCP Server - shared core
+MCP server, tool handlers, render pool/caches and the stdio transport used by
+both server.py and server_standalone.py.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import sys
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+# Names used by the entry points (server.py, server_standalone.py)
+__all__ = [
+    "logger",
+    "server",
+    "json_loads",
+    "TOOL_DISPATCH",
+    "INIT_OPTIONS",
+    "render_messages",
+    "prestart_render_pool",
+    "execute_tool",
+    "set_admission_limit",
+    "run_stdio",
+]
+
+# Diagnostics go to stderr through one logger; stdout carries the stdio protocol
+logger = logging.getLogger("mind-map-mcp")
+if not logger.handlers:
+    _log_handler = logging.StreamHandler(sys.stderr)
+    _log_handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_log_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# pybase64 (SIMD base64) is optional and encodes straight into a str;
+# the standard library fallback has to go through an intermediate bytes object
+try:
+    from pybase64 import b64encode_as_string as _b64encode_str
+except ImportError:
+    from base64 import b64encode as _b64encode
+    
+    def _b64encode_str(data) -> str:
+        return _b64encode(data).decode("ascii")
+
+# orjson is optional as well; both helpers keep the stdlib json output format
+try:
+    import orjson
+    
+    def _json_dumps(data) -> str:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode("utf-8")
+    
+    json_loads = orjson.loads
+except ImportError:
+    def _json_dumps(data) -> str:
+        return json.dumps(data, ensure_ascii=False, indent=2)
+    
+    json_loads = json.loads
+
+import anyio
+import anyio.to_thread
+from mcp.server import Server
+from mcp.server.stdio import stdio_server
+from mcp.types import (
+    Tool, 
+    TextContent, 
+    ImageContent, 
+    EmbeddedResource, 
+    CallToolResult,
+    CallToolRequest
+)
+
+from . import mind_map_center
+from . import mind_map_free
+from . import mind_map_horizontal
+
+# Tool classes resolved once: by /generate layout name and by MCP tool name
+TOOL_DISPATCH = {
+    "center": mind_map_center.get_tool(),
+    "horizontal": mind_map_horizontal.get_tool(),
+    "free": mind_map_free.get_tool(),
+}
+_TOOLS_BY_NAME = {
+    "create_center_mindmap": TOOL_DISPATCH["center"],
+    "create_horizontal_mindmap": TOOL_DISPATCH["horizontal"],
+    "create_free_mindmap": TOOL_DISPATCH["free"],
+}
+
+# Initialize the MCP server
+server = Server("mind-map-mcp")
+
+# --- Render cache ---
+# Rendering is deterministic for a given tool, filename and markdown, so successful
+# results are kept in an LRU cache keyed by a content hash of the markdown. Only the raw
+# tool messages are stored (MCP responses encode base64 from them), bounded by PNG bytes.
+_CACHE_MAX_BYTES = 64 * 1024 * 1024
+_render_cache = OrderedDict()   # key -> (tool messages, PNG bytes held)
+_render_cache_bytes = 0
+
+def _cache_key(tool_class, filename: str, markdown_content: str) -> tuple:
+    digest = hashlib.blake2b(markdown_content.encode("utf-8"), digest_size=16).digest()
+    return (tool_class.__module__, tool_class.__name__, filename, digest)
+
+def _cache_get(key: tuple):
+    entry = _render_cache.get(key)
+    if entry is None:
+        return None
+    _render_cache.move_to_end(key)
+    return entry[0]
+
+def _cache_put(key: tuple, messages: list) -> None:
+    global _render_cache_bytes
+    size = sum(len(message["blob"]) for message in messages if message["type"] == "blob")
+    if size > _CACHE_MAX_BYTES:
+        return
+    previous = _render_cache.pop(key, None)
+    if previous is not None:
+        _render_cache_bytes -= previous[1]
+    _render_cache[key] = (messages, size)
+    _render_cache_bytes += size
+    while _render_cache_bytes > _CACHE_MAX_BYTES:
+        _, (_, evicted_size) = _render_cache.popitem(last=False)
+        _render_cache_bytes -= evicted_size
+
+def _restamp_messages(messages: list) -> list:
+    """Copy cached messages with generation_time set to now instead of the original run's time"""
+    restamped = []
+    for message in messages:
+        if message["type"] == "json" and "generation_time" in message["data"]:
+            data = {**message["data"], "generation_time": time.strftime("%Y-%m-%d %H:%M:%S")}
+            message = {**message, "data": data}
+        restamped.append(message)
+    return restamped
+
+# Rendering is CPU-bound and holds the GIL, so it runs in worker processes to keep
+# the event loop responsive and let concurrent requests use several cores
+_render_pool = None
+# Each worker holds numpy/PIL/matplotlib (~100 MB), so only a couple are started by default
+_RENDER_WORKERS = max(1, int(os.environ.get("MIND_MAP_RENDER_WORKERS", min(2, os.cpu_count() or 1))))
+_WARMUP_MARKDOWN = "# warmup\n## warmup"
+# MIND_MAP_PRESTART=0 skips the boot-time worker when idle memory matters more than first-call latency
+_PRESTART = os.environ.get("MIND_MAP_PRESTART", "1") != "0"
+
+def _warm_up_worker():
+    """Pool initializer: load every layout and its fonts when a worker is first spawned"""
+    for tool_class in TOOL_DISPATCH.values():
+        _run_tool(tool_class, _WARMUP_MARKDOWN, "warmup")
+
+def _get_render_pool() -> ProcessPoolExecutor:
+    global _render_pool
+    if _render_pool is None:
+        # spawn: workers must not inherit the event loop or transport threads via fork
+        _render_pool = ProcessPoolExecutor(
+            max_workers=_RENDER_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_up_worker
+        )
+    return _render_pool
+
+def prestart_render_pool():
+    """
+    Spawn one render worker in the background at boot so its imports and warm-up
+    renders are done before the first request; further workers still start on demand
+    """
+    if _PRESTART:
+        _get_render_pool().submit(int)
+
+# Tool instances reused across renders; each worker process keeps its own and runs one task at a time
+_TOOL_INSTANCES = {}
+
+def _run_tool(tool_class, markdown_content: str, filename: str):
+    """Run a tool in a worker process; returns (messages, error) as plain picklable data"""
+    tool_instance = _TOOL_INSTANCES.get(tool_class)
+    if tool_instance is None:
+        tool_instance = _TOOL_INSTANCES[tool_class] = tool_class()
+    
+    # Input parameters expected by the tool
+    params = {
+        "markdown_content": markdown_content,
+        "filename": filename
+    }
+    
+    messages = []
+    try:
+        # The _invoke method is a generator
+        for message in tool_instance._invoke(params):
+            messages.append(message)
+    except Exception as e:
+        return messages, str(e)
+    return messages, None
+
+# Admission control: at most _admission_limit renders are in flight per process; further
+# requests wait here instead of piling up (with their results) behind the executor.
+# A Condition rather than a Semaphore so the limit can be changed at runtime.
+_admission_limit = int(os.environ.get("MIND_MAP_MAX_RENDERS", max(8, 2 * _RENDER_WORKERS)))
+_admission_count = 0
+_admission_cond = None
+
+def _get_admission_cond() -> asyncio.Condition:
+    # Created on first use so it belongs to the running event loop, not to import time
+    global _admission_cond
+    if _admission_cond is None:
+        _admission_cond = asyncio.Condition()
+    return _admission_cond
+
+async def set_admission_limit(limit: int) -> None:
+    """Change the number of concurrent renders; waiting requests are re-checked immediately"""
+    global _admission_limit
+    cond = _get_admission_cond()
+    async with cond:
+        _admission_limit = max(1, limit)
+        cond.notify_all()
+
+@asynccontextmanager
+async def _render_slot():
+    global _admission_count
+    cond = _get_admission_cond()
+    async with cond:
+        await cond.wait_for(lambda: _admission_count < _admission_limit)
+        _admission_count += 1
+    try:
+        yield
+    finally:
+        async with cond:
+            _admission_count -= 1
+            cond.notify(1)
+
+async def render_messages(tool_class, markdown_content: str, filename: str):
+    """
+    Run the tool and collect its messages, reusing a cached result for identical input.
+    Returns (messages, error); only runs that produced an image are cached.
+    """
+    key = _cache_key(tool_class, filename, markdown_content)
+    cached = _cache_get(key)
+    if cached is not None:
+        return _restamp_messages(cached), None
+    
+    global _render_pool
+    loop = asyncio.get_running_loop()
+    async with _render_slot():
+        pool = _get_render_pool()
+        try:
+            messages, error = await loop.run_in_executor(
+                pool, _run_tool, tool_class, markdown_content, filename
+            )
+        except BrokenProcessPool as e:
+            # A worker died (e.g. OOM-killed); drop the pool so the next render gets a fresh one
+            logger.error("Render worker terminated abruptly: %s", e)
+            if _render_pool is pool:
+                _render_pool = None
+            pool.shutdown(wait=False)
+            return [], f"Render worker terminated abruptly: {e}"
+    if error is not None:
+        return messages, error
+    
+    if any(message["type"] == "blob" for message in messages):
+        _cache_put(key, messages)
+    return messages, None
+
+# Tool message -> MCP content converters, dispatched on the message type
+def _blob_content(message) -> ImageContent:
+    # Convert binary blob to base64 encoded image content
+    return ImageContent(
+        type="image",
+        data=_b64encode_str(message["blob"]),
+        mimeType=message["meta"].get("mime_type", "image/png")
+    )
+
+def _text_content(message) -> TextContent:
+    return TextContent(type="text", text=message["text"])
+
+def _json_content(message) -> TextContent:
+    # Append JSON metadata as text for visibility
+    return TextContent(type="text", text=f"Metadata:\n{_json_dumps(message['data'])}")
+
+_CONTENT_BUILDERS = {
+    "blob": _blob_content,
+    "text": _text_content,
+    "json": _json_content,
+}
+
+# Helper function to execute the Dify tool logic and convert to MCP response
+async def execute_tool(tool_class, markdown_content: str) -> List[Any]:
+    messages, error = await render_messages(tool_class, markdown_content, "mindmap")
+    
+    content = []
+    
+    try:
+        for message in messages:
+            build = _CONTENT_BUILDERS.get(message["type"])
+            if build is not None:
+                content.append(build(message))
+                
+    except Exception as e:
+        logger.exception("Tool execution failed")
+        error = str(e)
+    
+    if error is not None:
+        content.append(TextContent(
+            type="text",
+            text=f"Error executing tool: {error}"
+        ))
+    return content
+
+# Tool definitions are static, so the list is built once at import time
+_TOOLS = [
+    Tool(
+        name="create_center_mindmap",
+        description="Create a radial/center layout mind map from Markdown text. Best for core-concept maps.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "markdown_content": {
+                    "type": "string",
+                    "description": "The markdown content to visualize as a mind map. Use headers (#) or list items (-/1.) to define hierarchy."
+                }
+            },
+            "required": ["markdown_content"]
+        }
+    ),
+    Tool(
+        name="create_horizontal_mindmap",
+        description="Create a horizontal (left-to-right) layout mind map from Markdown text. Best for timelines or process flows.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "markdown_content": {
+                    "type": "string",
+                    "description": "The markdown content to visualize as a mind map."
+                }
+            },
+            "required": ["markdown_content"]
+        }
+    ),
+    Tool(
+        name="create_free_mindmap",
+        description="Create a smart/free structure mind map. Automatically chooses between Center and Horizontal layouts based on complexity.",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "markdown_content": {
+                    "type": "string",
+                    "description": "The markdown content to visualize as a mind map."
+                }
+            },
+            "required": ["markdown_content"]
+        }
+    )
+]
+
+@server.list_tools()
+async def handle_list_tools() -> List[Tool]:
+    return _TOOLS
+
+@server.call_tool()
+async def handle_call_tool(name: str, arguments: dict | None) -> List[TextContent | ImageContent | EmbeddedResource]:
+    if not arguments:
+        raise ValueError("Missing arguments")
+    
+    markdown_content = arguments.get("markdown_content")
+    if not markdown_content:
+        raise ValueError("Missing markdown_content")
+
+    tool_class = _TOOLS_BY_NAME.get(name)
+    if tool_class is None:
+        raise ValueError(f"Unknown tool: {name}")
+    return await execute_tool(tool_class, markdown_content)
+
+# Depends only on the registered handlers, so it is computed once for every session
+INIT_OPTIONS = server.create_initialization_options()
+
+# Size of the preallocated stdin read buffer
+_STDIN_BUFFER_SIZE = 64 * 1024
+
+class _StdinProtocol(asyncio.BufferedProtocol):
+    """Reads stdin into one preallocated buffer and queues complete JSON-RPC lines"""
+    
+    def __init__(self, queue: asyncio.Queue):
+        self._queue = queue
+        self._buffer = bytearray(_STDIN_BUFFER_SIZE)
+        self._partial = bytearray()
+    
+    def get_buffer(self, sizehint: int):
+        return self._buffer
+    
+    def buffer_updated(self, nbytes: int):
+        data = memoryview(self._buffer)[:nbytes]
+        start = 0
+        while True:
+            end = self._buffer.find(b"\n", start, nbytes)
+            if end < 0:
+                break
+            if self._partial:
+                # A line spanning several reads is joined only once it is complete
+                self._partial += data[start:end]
+                line = bytes(self._partial)
+                self._partial.clear()
+            else:
+                line = bytes(data[start:end])
+            self._queue.put_nowait(line)
+            start = end + 1
+        if start < nbytes:
+            self._partial += data[start:]
+    
+    def eof_received(self):
+        if self._partial:
+            self._queue.put_nowait(bytes(self._partial))
+            self._partial.clear()
+        self._queue.put_nowait(None)
+    
+    def connection_lost(self, exc):
+        self._queue.put_nowait(None)
+
+async def _stdin_lines(raw):
+    """
+    Async iterator of stdin lines for mcp's stdio_server. Blocking readinto() calls on a
+    worker thread write straight into _StdinProtocol's buffer, one thread hop per read
+    rather than per line; the fd itself is left in blocking mode.
+    """
+    queue = asyncio.Queue()
+    protocol = _StdinProtocol(queue)
+    while True:
+        try:
+            nbytes = await anyio.to_thread.run_sync(raw.readinto, protocol.get_buffer(-1))
+        except OSError as exc:
+            protocol.connection_lost(exc)
+        else:
+            if nbytes:
+                protocol.buffer_updated(nbytes)
+            else:
+                protocol.eof_received()
+        while not queue.empty():
+            line = queue.get_nowait()
+            if line is None:
+                return
+            yield line.decode("utf-8", errors="replace")
+
+@asynccontextmanager
+async def _stdio_transport():
+    """
+    mcp's stdio_server fed by _stdin_lines; message validation, output and shutdown stay
+    mcp's. Falls back to stdio_server's own reader when stdin has no raw file underneath.
+    """
+    raw = getattr(getattr(sys.stdin, "buffer", None), "raw", None)
+    stdin = _stdin_lines(raw) if hasattr(raw, "readinto") else None
+    async with stdio_server(stdin=stdin) as streams:
+        yield streams
+
+def run_stdio():
+    """Run the server using stdio transport"""
+    prestart_render_pool()
+    
+    async def _run():
+        async with _stdio_transport() as (read, write):
+            await server.run(read, write, INIT_OPTIONS)
+    
+    asyncio.run(_run())
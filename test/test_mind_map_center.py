@@ -0,0 +1,59 @@
+"""Tests for the center (radial) layout in src/mind_map_center.py"""
+
+import itertools
+import unittest
+
+from src.mind_map_center import MindMapCenterTool
+
+# Gap the layout keeps between node boxes, less a pixel of slack for float rounding
+_MIN_GAP = 19
+
+
+def _wide_deep_markdown(branches: int = 12, children: int = 6, grandchildren: int = 4) -> str:
+    lines = ["# 中心主题 Central Topic"]
+    for b in range(branches):
+        lines.append(f"## Branch {b} 分支")
+        for c in range(children):
+            lines.append(f"- Child {b}.{c} with a longer label")
+            for g in range(grandchildren):
+                lines.append(f"  - Leaf {b}.{c}.{g}")
+    return "\n".join(lines)
+
+
+class CenterLayoutTest(unittest.TestCase):
+
+    def _layout(self, markdown: str) -> list:
+        tool = MindMapCenterTool()
+        tree = tool._parse_markdown_to_tree(markdown)
+        tool._precompute_text_sizes(tree, tool._setup_pil_chinese_font())
+        return tool._layout_nodes(tree)
+
+    def test_wide_deep_map_has_no_overlapping_nodes(self):
+        nodes = self._layout(_wide_deep_markdown())
+        self.assertEqual(len(nodes), 1 + 12 * (1 + 6 * (1 + 4)))
+
+        overlaps = [
+            (a['text'], b['text'])
+            for a, b in itertools.combinations(nodes, 2)
+            if abs(a['x'] - b['x']) < (a['width'] + b['width']) / 2 + _MIN_GAP
+            and abs(a['y'] - b['y']) < (a['height'] + b['height']) / 2 + _MIN_GAP
+        ]
+        self.assertEqual(overlaps, [])
+
+    def test_children_are_placed_outside_their_parent(self):
+        nodes = self._layout(_wide_deep_markdown(branches=5, children=3, grandchildren=2))
+        for node in nodes:
+            if node['depth'] > 1:
+                parent_radius = (node['parent_x'] ** 2 + node['parent_y'] ** 2) ** 0.5
+                radius = (node['x'] ** 2 + node['y'] ** 2) ** 0.5
+                self.assertGreater(radius, parent_radius, node['text'])
+
+    def test_render_produces_png(self):
+        messages = list(MindMapCenterTool()._invoke({'markdown_content': _wide_deep_markdown(3, 2, 1)}))
+        blobs = [m for m in messages if m['type'] == 'blob']
+        self.assertEqual(len(blobs), 1)
+        self.assertTrue(blobs[0]['blob'].startswith(b'\x89PNG'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+"""Tests for the render cache in src/server_core.py"""
+
+import unittest
+from unittest import mock
+
+from src import server_core
+from src.server_core import _cache_get, _cache_key, _cache_put, render_messages
+
+
+def _messages(size: int, generation_time: str = "2000-01-01 00:00:00") -> list:
+    return [
+        {"type": "blob", "blob": b"x" * size, "meta": {"mime_type": "image/png"}},
+        {"type": "text", "text": "ok"},
+        {"type": "json", "data": {"success": True, "generation_time": generation_time}},
+    ]
+
+
+class RenderCacheTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.multiple(server_core, _CACHE_MAX_BYTES=1000, _render_cache_bytes=0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        saved = server_core._render_cache.copy()
+        server_core._render_cache.clear()
+        self.addCleanup(server_core._render_cache.update, saved)
+        self.addCleanup(server_core._render_cache.clear)
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        _cache_put(("a",), _messages(400))
+        _cache_put(("b",), _messages(400))
+        self.assertIsNotNone(_cache_get(("a",)))  # "a" becomes most recently used
+        _cache_put(("c",), _messages(400))
+
+        self.assertIsNone(_cache_get(("b",)))
+        self.assertIsNotNone(_cache_get(("a",)))
+        self.assertIsNotNone(_cache_get(("c",)))
+        self.assertEqual(server_core._render_cache_bytes, 800)
+
+    def test_replacing_an_entry_updates_the_byte_count(self):
+        _cache_put(("a",), _messages(400))
+        _cache_put(("a",), _messages(300))
+        self.assertEqual(server_core._render_cache_bytes, 300)
+        self.assertEqual(len(server_core._render_cache), 1)
+
+    def test_result_larger_than_budget_is_not_cached(self):
+        _cache_put(("a",), _messages(400))
+        _cache_put(("big",), _messages(1001))
+        self.assertIsNone(_cache_get(("big",)))
+        self.assertIsNotNone(_cache_get(("a",)))
+        self.assertEqual(server_core._render_cache_bytes, 400)
+
+    async def test_cache_hit_restamps_generation_time(self):
+        tool_class = server_core.TOOL_DISPATCH["center"]
+        cached = _messages(10)
+        _cache_put(_cache_key(tool_class, "mindmap", "# a"), cached)
+
+        with mock.patch.object(server_core, "_get_render_pool") as get_pool:
+            messages, error = await render_messages(tool_class, "# a", "mindmap")
+        get_pool.assert_not_called()
+
+        self.assertIsNone(error)
+        self.assertIs(messages[0]["blob"], cached[0]["blob"])
+        self.assertNotEqual(messages[2]["data"]["generation_time"], "2000-01-01 00:00:00")
+        self.assertTrue(messages[2]["data"]["success"])
+        # The cached copy keeps its original data
+        self.assertEqual(cached[2]["data"]["generation_time"], "2000-01-01 00:00:00")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+"""Tests for the stdio line framing in src/server_core.py"""
+
+import asyncio
+import json
+import os
+import threading
+import unittest
+
+from mcp.server.stdio import stdio_server
+from mcp.shared.message import SessionMessage
+
+from src.server_core import _STDIN_BUFFER_SIZE, _StdinProtocol, _stdin_lines
+
+
+def _feed(protocol, data: bytes) -> None:
+    """Deliver data through the protocol's buffer the way a transport would"""
+    while data:
+        buffer = protocol.get_buffer(-1)
+        nbytes = min(len(buffer), len(data))
+        buffer[:nbytes] = data[:nbytes]
+        protocol.buffer_updated(nbytes)
+        data = data[nbytes:]
+
+
+def _drain(queue: asyncio.Queue) -> list:
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+
+def _request(request_id: int, text: str = "") -> bytes:
+    message = {"jsonrpc": "2.0", "id": request_id, "method": "ping", "params": {"text": text}}
+    return json.dumps(message).encode("utf-8")
+
+
+class StdinProtocolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = asyncio.Queue()
+        self.protocol = _StdinProtocol(self.queue)
+
+    def test_several_lines_in_one_read(self):
+        _feed(self.protocol, b"one\ntwo\nthree\n")
+        self.assertEqual(_drain(self.queue), [b"one", b"two", b"three"])
+
+    def test_partial_line_is_held_until_complete(self):
+        _feed(self.protocol, b'{"a":')
+        self.assertEqual(_drain(self.queue), [])
+        _feed(self.protocol, b' 1}\n{"b"')
+        self.assertEqual(_drain(self.queue), [b'{"a": 1}'])
+        _feed(self.protocol, b': 2}\n')
+        self.assertEqual(_drain(self.queue), [b'{"b": 2}'])
+
+    def test_line_larger_than_buffer(self):
+        line = b"x" * (3 * _STDIN_BUFFER_SIZE + 123)
+        _feed(self.protocol, line + b"\nnext\n")
+        self.assertEqual(_drain(self.queue), [line, b"next"])
+
+    def test_eof_flushes_trailing_partial_line(self):
+        _feed(self.protocol, b"done\ntail")
+        self.protocol.eof_received()
+        self.assertEqual(_drain(self.queue), [b"done", b"tail", None])
+
+    def test_eof_without_partial_line(self):
+        _feed(self.protocol, b"done\n")
+        self.protocol.eof_received()
+        self.assertEqual(_drain(self.queue), [b"done", None])
+
+
+class StdinLinesTest(unittest.IsolatedAsyncioTestCase):
+
+    async def _read_through_pipe(self, data: bytes, reader):
+        read_fd, write_fd = os.pipe()
+
+        def _write():
+            with open(write_fd, "wb") as f:
+                f.write(data)
+
+        writer = threading.Thread(target=_write)
+        writer.start()
+        try:
+            with open(read_fd, "rb", buffering=0) as raw:
+                return await reader(raw)
+        finally:
+            writer.join()
+
+    async def test_lines_from_pipe(self):
+        big = _request(1, "长" * (2 * _STDIN_BUFFER_SIZE))
+        data = big + b"\n" + _request(2) + b"\n" + _request(3)
+
+        async def _collect(raw):
+            return [line async for line in _stdin_lines(raw)]
+
+        lines = await self._read_through_pipe(data, _collect)
+        self.assertEqual(lines, [big.decode("utf-8"), _request(2).decode(), _request(3).decode()])
+
+    async def test_stdio_server_reports_invalid_json(self):
+        data = _request(1) + b"\n" + b"not json\n" + _request(2) + b"\n"
+
+        async def _collect(raw):
+            received = []
+            async with stdio_server(stdin=_stdin_lines(raw)) as (read_stream, write_stream):
+                async with read_stream:
+                    async for item in read_stream:
+                        received.append(item)
+                await write_stream.aclose()
+            return received
+
+        received = await self._read_through_pipe(data, _collect)
+        self.assertEqual(len(received), 3)
+        self.assertIsInstance(received[0], SessionMessage)
+        self.assertEqual(received[0].message.root.id, 1)
+        self.assertIsInstance(received[1], Exception)
+        self.assertIsInstance(received[2], SessionMessage)
+        self.assertEqual(received[2].message.root.id, 2)
+
+    async def test_fd_stays_blocking(self):
+        read_fd, write_fd = os.pipe()
+        os.close(write_fd)
+        with open(read_fd, "rb", buffering=0) as raw:
+            self.assertEqual([line async for line in _stdin_lines(raw)], [])
+            self.assertTrue(os.get_blocking(read_fd))
+
+
+if __name__ == "__main__":
+    unittest.main()